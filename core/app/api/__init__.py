@@ -1,2 +1,2 @@
 from .routers import router_files, router_users, router_addresses, router_calls, router_notes, router_tasks, router_teams, router_statistics
-from .middlewares import get_user_from_request, auth_middleware, error_middleware
+from .middlewares import get_user_from_request, auth_middleware, error_middleware, session_middleware, token_cache
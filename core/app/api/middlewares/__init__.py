@@ -1,2 +1,3 @@
-from .auth_middleware import auth_middleware, get_user_from_request
+from .auth_middleware import auth_middleware, get_user_from_request, token_cache
 from .error_middleware import error_middleware
+from .session_middleware import session_middleware
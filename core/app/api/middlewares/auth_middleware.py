@@ -1,41 +1,119 @@
+import asyncio
 import json
+import time
 from fastapi import HTTPException, Header, Request, status
 import aiohttp
 from datetime import datetime
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from app.toml_helper import load_var_from_toml
+from app.toml_helper import get_settings
 from app.api.models import UserCredentials
+from app.utils.token_cache import TokenCache
+from app.utils.http_client import HttpClient
+from app.utils.single_flight import SingleFlight
+from app.utils.token_verifier import LocalTokenVerifier, TokenInvalid, TokenUnknown
+from app.database.repositories import UsersRepository
+
+
+token_cache = TokenCache.factory()
+token_verifications = SingleFlight()
+local_token_verifier = LocalTokenVerifier.factory()
+
+
+class TokenRejected(Exception):
+    """Сервис auth отклонил токен - такой результат можно кешировать"""
+    pass
+
+
+async def verify_token(token: str) -> UserCredentials:
+    """Проверяет токен: сначала в кеше, затем через сервис auth"""
+    cached = await token_cache.get(token)
+    if cached is not None:
+        if cached.error is not None:
+            raise TokenRejected(cached.error)
+        return cached.user
+
+    if local_token_verifier is not None:
+        user = await verify_token_locally(token)
+        if user is not None:
+            return user
+
+    # NOTE: параллельные запросы с одним токеном делят один запрос к auth
+    return await token_verifications.do(TokenCache.hash_token(token), lambda: fetch_token_owner(token))
+
+
+async def verify_token_locally(token: str) -> UserCredentials | None:
+    """
+    Проверяет подпись и claims токена без запроса в auth, а отзыв токена, is_active и права - одним запросом к БД auth,
+    как это делает сам auth. Результат кешируется в token_cache, как и проверка через auth.
+    None - токен нужно проверить в auth (в том числе отозванный: auth отклонит его, и отказ закешируется).
+    """
+    try:
+        claims = local_token_verifier.decode(token)
+    except TokenInvalid as e:
+        await token_cache.set_invalid(token, e.__str__())
+        raise TokenRejected(e.__str__())
+    except TokenUnknown:
+        return None
+    if await token_cache.is_user_revoked(claims["user_id"]):
+        return None
+    async with UsersRepository() as users_repository:
+        owner = await users_repository.get_token_owner(claims["jti"], claims["user_id"])
+    if owner is None:
+        return None
+    if not owner.is_active:
+        await token_cache.set_invalid(token, "account is not active")
+        raise TokenRejected("account is not active")
+    user = UserCredentials(
+        id=owner.id,
+        login=owner.login,
+        privileges=owner.privileges.value,
+        created_at=owner.created_at,
+        is_active=owner.is_active
+    )
+    await token_cache.set_valid(token, user, ttl=int(claims["exp"] - time.time()))
+    return user
+
+
+async def fetch_token_owner(token: str) -> UserCredentials:
+    """Проверяет токен через сервис auth и кеширует результат"""
+    headers = {'accept': 'application/json',
+               'Authorization': token}
+    params = {}
+    session = await HttpClient.get_session()
+    async with session.get(f"{get_settings().services.auth_url}/api/Accounts/Me",
+                           headers=headers, params=params) as response:
+        response_text = await response.text()
+        if response.status in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN):
+            await token_cache.set_invalid(token, response_text)
+            raise TokenRejected(response_text)
+        if not str(response.status).startswith('2'):
+            raise Exception(response_text)
+
+        auth_response = AuthResponse.model_validate_json(response_text)
+
+        if not auth_response.user.is_active:
+            await token_cache.set_invalid(token, "account is not active")
+            raise TokenRejected("account is not active")
+
+        await token_cache.set_valid(token, auth_response.user)
+        return auth_response.user
 
 
 async def auth_middleware(request: Request, call_next):
-    if not request.url.path.startswith(("/addresses", "/calls", "/notes", "/tasks", "/teams", "/users", "/files")):
+    if not request.url.path.startswith(("/addresses", "/calls", "/notes", "/tasks", "/teams", "/users", "/files", "/statistics")):
         return await call_next(request)
 
     try:
-        headers = {'accept': 'application/json',
-                   'Authorization': request.headers['token-authorization']}
-        params = {}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://{load_var_from_toml('services', 'auth_host')}:{load_var_from_toml('services', 'auth_port')}/api/Accounts/Me",
-                                   headers=headers, params=params) as response:
-                response_text = await response.text()
-                if not str(response.status).startswith('2'):
-                    raise Exception(response_text)
-
-                auth_response = AuthResponse.model_validate_json(response_text)
-
-                if not auth_response.user.is_active:
-                    raise Exception("account is not active")
-
-                request.state.__setattr__(
-                    'user_credentials', auth_response.user)
-                return await call_next(request)
-    except aiohttp.ClientConnectorDNSError as e:
+        user_credentials = await verify_token(request.headers['token-authorization'])
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
         return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"details": "Server infrastructure error"}, headers={'content-type': 'application/json'})
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"details": e.__str__()}, headers={'content-type': 'application/json'})
 
+    request.state.__setattr__('user_credentials', user_credentials)
+    return await call_next(request)
+
 
 def get_user_from_request(request: Request, token_authorization: str = Header(alias='token-authorization')) -> UserCredentials:
     # NOTE: здесь указывается параметр token_authorization, для того чтобы не указывать его явно в каждой конечной точке
@@ -0,0 +1,10 @@
+from fastapi import Request
+from app.database.session_scope import session_scope
+
+
+async def session_middleware(request: Request, call_next):
+    # NOTE: репозитории одного запроса делят одну сессию; соединение берется из пула при первом запросе к БД
+    # в блоке async with репозитория и возвращается после выхода из внешнего блока
+    user_credentials = getattr(request.state, 'user_credentials', None)
+    async with session_scope(user_credentials.id if user_credentials else None):
+        return await call_next(request)
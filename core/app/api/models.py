@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Generic, List, Optional, TypeVar
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass
@@ -31,6 +31,12 @@ class WorkTypes(str, Enum):
     EXCLUSIVE_CONTRACT = "EXCLUSIVE_CONTRACT"
 
 
+class StatisticBuckets(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
 class KpiLevels(str, Enum):
     TRAINEE = "TRAINEE"
     SPECIALIST = "SPECIALIST"
@@ -100,6 +106,9 @@ class RegData(BaseModel):
 
 
 class Note(BaseModel):
+    class Config:
+        from_attributes = True
+
     id: str
     user_id: str
     title: str
@@ -108,6 +117,9 @@ class Note(BaseModel):
 
 
 class Task(BaseModel):
+    class Config:
+        from_attributes = True
+
     id: str
     user_id: str
     work_type: WorkTypes | str
@@ -146,6 +158,17 @@ class StatisticAggregated(BaseModel):
     works: dict[WorkTypes | str, int]
 
 
+class StatisticSeries(BaseModel):
+    """Ряд статистики по колонкам: buckets - начала интервалов (unix время), works - суммы по интервалам для каждого типа работ"""
+    user_id: str
+    start: int
+    end: int
+    bucket: StatisticBuckets
+    timezone: str
+    buckets: list[int]
+    works: dict[WorkTypes | str, list[int]]
+
+
 class Statistic(BaseModel):
     id: str
     user_id: str
@@ -156,6 +179,17 @@ class Statistic(BaseModel):
     is_archive: bool
 
 
+class StatisticBatchItem(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class StatisticBatchResult(BaseModel):
+    inserted: int
+    items: List[StatisticBatchItem]
+
+
 class KpiSummary(BaseModel):
     last_month_kpi: float
     current_month_kpi: float
@@ -165,6 +199,9 @@ class KpiSummary(BaseModel):
 
 
 class Address(BaseModel):
+    class Config:
+        from_attributes = True
+
     id: str
     user_id: str
     address: str
@@ -175,12 +212,15 @@ class Address(BaseModel):
 
 class Kpi(BaseModel):
     user_id: str
-    kpi_level: KpiLevels | str
+    kpi_level: KpiLevels
     base_salary_percentage: float
     kpi: float
 
 
 class Call(BaseModel):
+    class Config:
+        from_attributes = True
+
     id: str
     user_id: str
     date_time: int
@@ -190,3 +230,23 @@ class Call(BaseModel):
     call_type: int
     transcription: Optional[str]
     file_id: Optional[str]
+
+
+class CallsSummary(BaseModel):
+    count: int = 0
+    total_length_seconds: int = 0
+    last_call_at: Optional[int] = None
+
+
+class AddressesSummary(BaseModel):
+    count: int = 0
+    last_address: Optional[Address] = None
+
+
+PageItem = TypeVar("PageItem")
+
+
+class Page(BaseModel, Generic[PageItem]):
+    items: List[PageItem]
+    # NOTE: непрозрачный курсор следующей страницы; None - страница последняя
+    next_cursor: Optional[str] = None
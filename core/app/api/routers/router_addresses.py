@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from app.database.repositories import AddressesRepository
+from app.database.repositories import AddressesRepository, TeamsRepository
 from app.api.models import Address, UserCredentials
 from app.api.middlewares import get_user_from_request
 from app.utils.osm import reverse_geocoding_by_coords
+from app.utils.pagination import PageParams, get_page_params, page_response
+from app.utils.fieldsets import fieldset
+from app.utils.ndjson import ndjson_response
 
 router_addresses = APIRouter(prefix="/addresses", tags=["Адреса"])
 
@@ -17,13 +20,13 @@ async def add_address(
     if address_info.user_id != user_credentials.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Not self account in address info")
+    if not address_info.address or address_info.address == "":
+        try:
+            address_info.address = (await reverse_geocoding_by_coords(
+                address_info.lat, address_info.lon))["display_name"]
+        except Exception as e:
+            address_info.address = ""
     async with addresses_repository:
-        if not address_info.address or address_info.address == "":
-            try:
-                address_info.address = await reverse_geocoding_by_coords()[
-                    "display_name"]
-            except Exception as e:
-                address_info.address = ""
         address_id = await addresses_repository.add_address_info(address_info)
         if not address_id:
             raise HTTPException(
@@ -31,18 +34,41 @@ async def add_address(
         return address_id
 
 
-@router_addresses.get("/user/{user_id}", status_code=status.HTTP_200_OK, description="Возвращает список почещенных локаций пользователем по его Id с фильтром по дате")
+@router_addresses.get("/user/{user_id}", status_code=status.HTTP_200_OK, description="Возвращает список почещенных локаций пользователем по его Id с фильтром по дате от новых к старым: постранично, если передан limit или cursor, иначе весь список массивом")
 async def get_addresses(
     user_id: str,
     date_start: int | None = None,
     date_end: int | None = None,
+    page: PageParams = Depends(get_page_params),
+    fields: list[str] | None = Depends(fieldset(Address, ("id", "date_time"))),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     addresses_repository: AddressesRepository = Depends(
         AddressesRepository.repository_factory)
 ):
     async with addresses_repository:
-        addresses = await addresses_repository.get_address_info_by_user_id(user_id, date_start, date_end)
-        if addresses is None:
+        addresses_page = await addresses_repository.get_user_addresses_page(user_id, page.limit, page.after, date_start, date_end, fields=fields)
+        if addresses_page is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Addresses not found")
-        return addresses
+        addresses, next_key = addresses_page
+        return page_response(addresses, next_key, page, Address, fields)
+
+
+@router_addresses.get("/user/{user_id}/export", status_code=status.HTTP_200_OK, description="Выгружает все посещенные локации пользователя по его Id с фильтром по дате потоком в формате NDJSON (одна запись на строку)")
+async def export_addresses(
+    user_id: str,
+    date_start: int | None = None,
+    date_end: int | None = None,
+    user_credentials: UserCredentials = Depends(get_user_from_request),
+    addresses_repository: AddressesRepository = Depends(
+        AddressesRepository.repository_factory),
+    teams_repository: TeamsRepository = Depends(
+        TeamsRepository.repository_factory)
+):
+    # NOTE: выгрузить чужие адреса может только Owner команды, в которой состоит этот пользователь
+    if user_id != user_credentials.id:
+        async with teams_repository:
+            if not await teams_repository.is_owner_of_user(user_credentials.id, user_id):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    # NOTE: сессия репозитория закрывается генератором после отправки последней строки
+    return ndjson_response(addresses_repository.stream_user_addresses(user_id, date_start, date_end), Address, f"addresses_{user_id}.ndjson")
@@ -1,11 +1,14 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Header, UploadFile, status
 from fastapi.responses import FileResponse
-from app.database.repositories import CallsRepository, FilesRepository
+from app.database.repositories import CallsRepository, FilesRepository, TeamsRepository
 from app.api.models import UserCredentials, Call
 from app.api.middlewares import get_user_from_request
 from app.utils.minio_client import MinioClient
 from app.utils import rabbitmq
+from app.utils.pagination import PageParams, get_page_params, page_response
+from app.utils.fieldsets import fieldset
+from app.utils.ndjson import ndjson_response
 
 router_calls = APIRouter(prefix="/calls", tags=["Звонки"])
 
@@ -21,8 +24,6 @@ async def add_call(
     user_credentials: UserCredentials = Depends(get_user_from_request),
     calls_repository: CallsRepository = Depends(
         CallsRepository.repository_factory),
-    files_repository: FilesRepository = Depends(
-        FilesRepository.repository_factory),
     minio_client: MinioClient = Depends(MinioClient.minio_client_factory)
 ):
     call = Call(
@@ -36,39 +37,62 @@ async def add_call(
         transcription=None,
         file_id=None
     )
-    new_file_id: str | None = None
     if file is not None:
         try:
             await file.seek(0)
             minio_client.upload_file(user_credentials.id, file)
-            new_file_id = await files_repository.add_file(file.filename, user_credentials.id, user_credentials.id)
         except IOError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="File format error")
 
     async with calls_repository:
-        call.file_id = new_file_id
-        record_id = await calls_repository.add_call_record_to_storage(call)
+        if file is not None:
+            # NOTE: звонок, файл и доступ к файлу записываются одной транзакцией
+            result = await calls_repository.add_call_record_with_file(call, file.filename, user_credentials.id)
+            record_id = result[0] if result else None
+        else:
+            record_id = await calls_repository.add_call_record_to_storage(call)
         if not record_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Unable to add call record")
         return record_id
 
 
-@router_calls.get("/user/{user_id}", status_code=status.HTTP_200_OK, description="Возвращает все звонки пользователя по его Id")
+@router_calls.get("/user/{user_id}", status_code=status.HTTP_200_OK, description="Возвращает звонки пользователя по его Id от новых к старым: постранично, если передан limit или cursor, иначе весь список массивом")
 async def get_calls(
     user_id: str,
+    page: PageParams = Depends(get_page_params),
+    fields: list[str] | None = Depends(fieldset(Call, ("id", "date_time"))),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     calls_repository: CallsRepository = Depends(
         CallsRepository.repository_factory)
 ):
     # TODO: проверка доступа
     async with calls_repository:
-        calls = await calls_repository.get_all_info_user_calls(user_id)
-        if calls is None:
+        calls_page = await calls_repository.get_user_calls_page(user_id, page.limit, page.after, fields=fields)
+        if calls_page is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Calls not found")
-        return calls
+        calls, next_key = calls_page
+        return page_response(calls, next_key, page, Call, fields)
+
+
+@router_calls.get("/user/{user_id}/export", status_code=status.HTTP_200_OK, description="Выгружает все звонки пользователя по его Id потоком в формате NDJSON (одна запись на строку)")
+async def export_calls(
+    user_id: str,
+    user_credentials: UserCredentials = Depends(get_user_from_request),
+    calls_repository: CallsRepository = Depends(
+        CallsRepository.repository_factory),
+    teams_repository: TeamsRepository = Depends(
+        TeamsRepository.repository_factory)
+):
+    # NOTE: выгрузить чужие звонки может только Owner команды, в которой состоит этот пользователь
+    if user_id != user_credentials.id:
+        async with teams_repository:
+            if not await teams_repository.is_owner_of_user(user_credentials.id, user_id):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    # NOTE: сессия репозитория закрывается генератором после отправки последней строки
+    return ndjson_response(calls_repository.stream_user_calls(user_id), Call, f"calls_{user_id}.ndjson")
 
 
 @router_calls.get("/{call_id}/transcription", status_code=status.HTTP_200_OK, description="Запускает расшифровку аудиозаписи звонка по его Id, если она была прикреплена (работать не будет, нейронка не поднята)")
@@ -92,7 +116,8 @@ async def order_call_transcription(
             if not file_info:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
-            return await rabbitmq.send_message_to_queue(call_id=call_id, object_name=file_info.obj_name, bucket_name=file_info.bucket_name)
+    # NOTE: публикация в очередь идет после выхода из блоков репозиториев, когда соединение с БД уже возвращено в пул
+    return await rabbitmq.send_message_to_queue(call_id=call_id, object_name=file_info.obj_name, bucket_name=file_info.bucket_name)
 
 
 # BAD: выискивать сообщение в очередях бессмысленно
@@ -10,7 +10,7 @@ from app.utils.minio_client import MinioClient
 router_files = APIRouter(prefix="/files", tags=["Файлы"])
 
 
-@router_files.get("/{file_id}", status_code=status.HTTP_200_OK, description="Возвращает информацию о файле по Id [без прав доступа]")
+@router_files.get("/{file_id}", status_code=status.HTTP_200_OK, description="Возвращает информацию о файле по Id, если у текущего пользователя есть к нему доступ")
 async def get_file_info(
     file_id: str,
     user_credentials: UserCredentials = Depends(get_user_from_request),
@@ -18,10 +18,12 @@ async def get_file_info(
         FilesRepository.repository_factory)
 ):
     async with files_repository:
+        if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
         return await files_repository.get_file_info_by_id(file_id)
 
 
-@router_files.post("/", status_code=status.HTTP_201_CREATED, description="Подгрузить файл [без прав доступа]")
+@router_files.post("/", status_code=status.HTTP_201_CREATED, description="Подгрузить файл; перезаписать существующий файл можно только с доступом WRITE")
 async def upload_file(
     file: UploadFile,
     file_id: Optional[str] = Form(...),
@@ -31,11 +33,16 @@ async def upload_file(
         FilesRepository.repository_factory)
 ):
     async with files_repository:
-        res = minio_client.upload_file(user_credentials.id, file)
+        if file_id and await files_repository.get_file_info_by_id(file_id) \
+                and not await files_repository.check_access(FileAccessMode.WRITE, user_credentials.id, file_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    # NOTE: загрузка в MinIO идет между блоками репозитория и не держит соединение с БД
+    res = minio_client.upload_file(user_credentials.id, file)
+    async with files_repository:
         return await files_repository.add_file(file.filename, user_credentials.id, user_credentials.id, file_id)
 
 
-@router_files.get("/{file_id}/download", status_code=status.HTTP_200_OK, description="Скачать файл в прямом виде (возвращает реально байты, без имени файла и расширения, мб перевернутый и тд) - не стоит пользоваться [без прав доступа]")
+@router_files.get("/{file_id}/download", status_code=status.HTTP_200_OK, description="Скачать файл в прямом виде (возвращает реально байты, без имени файла и расширения, мб перевернутый и тд) - не стоит пользоваться")
 async def download_file_stream(
     file_id: str,
     user_credentials: UserCredentials = Depends(get_user_from_request),
@@ -45,13 +52,15 @@ async def download_file_stream(
 ):
     # REVIEW: возвращает реально поток, без имени файла, мб перевернутый и тд
     async with files_repository:
-        # if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
-        #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
         file_info = await files_repository.get_file_info_by_id(file_id)
-        return minio_client.download_file(file_info.bucket_name, file_info.obj_name)
+        if not file_info:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return minio_client.download_file(file_info.bucket_name, file_info.obj_name)
 
 
-@router_files.get("/{file_id}/presigned_url", status_code=status.HTTP_200_OK, description="Возвращает ссылку для скачивания файла [без прав доступа]")
+@router_files.get("/{file_id}/presigned_url", status_code=status.HTTP_200_OK, description="Возвращает ссылку для скачивания файла, если у текущего пользователя есть к нему доступ")
 async def get_presigned_file(
     file_id: str,
     user_credentials: UserCredentials = Depends(get_user_from_request),
@@ -60,24 +69,20 @@ async def get_presigned_file(
         FilesRepository.repository_factory)
 ):
     async with files_repository:
-        # if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
-        #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
         file_info = await files_repository.get_file_info_by_id(file_id)
-        # if user_credentials.id in list(map(lambda item: item.user_id, await files_repository.get_file_access(file_id))):
-        #     url = minio_client.get_presigned_url(
-        #         file_info.bucket_name, file_info.obj_name)
-        #     return {"url": url}
-        # else:
-        #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-        try:
-            url = minio_client.get_presigned_url(
-                file_info.bucket_name, file_info.obj_name)
-            return {"url": url}
-        except Exception:
-            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
+        if not file_info:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    try:
+        url = minio_client.get_presigned_url(
+            file_info.bucket_name, file_info.obj_name)
+        return {"url": url}
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED)
 
 
-@router_files.delete("/{file_id}", status_code=status.HTTP_202_ACCEPTED, description="удаляет файл по Id [без прав доступа]")
+@router_files.delete("/{file_id}", status_code=status.HTTP_202_ACCEPTED, description="Удаляет файл по Id; нужен доступ WRITE")
 async def delete_file(
     file_id: str,
     user_credentials: UserCredentials = Depends(get_user_from_request),
@@ -86,10 +91,12 @@ async def delete_file(
         FilesRepository.repository_factory)
 ):
     async with files_repository:
-        # if not await files_repository.check_access(FileAccessMode.READ, user_credentials.id, file_id):
-        #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        if not await files_repository.check_access(FileAccessMode.WRITE, user_credentials.id, file_id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
         file_info = await files_repository.get_file_info_by_id(file_id)
+        if not file_info:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
         delete_success = await files_repository.delete_file(file_id)
         if not delete_success:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-        return minio_client.delete_file(file_info.bucket_name, file_info.obj_name)
+    return minio_client.delete_file(file_info.bucket_name, file_info.obj_name)
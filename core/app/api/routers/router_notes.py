@@ -2,22 +2,27 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from app.database.repositories import NotesRepository
 from app.api.models import Note, UserCredentials
 from app.api.middlewares import get_user_from_request
+from app.utils.pagination import PageParams, get_page_params, page_response
+from app.utils.fieldsets import fieldset
 
 router_notes = APIRouter(prefix="/notes", tags=["Заметки"])
 
 
-@router_notes.get("/", status_code=status.HTTP_200_OK, description="Возвращает все заметки текущего пользователя")
+@router_notes.get("/", status_code=status.HTTP_200_OK, description="Возвращает заметки текущего пользователя от новых к старым: постранично, если передан limit или cursor, иначе весь список массивом")
 async def get_notes(
+    page: PageParams = Depends(get_page_params),
+    fields: list[str] | None = Depends(fieldset(Note, ("id", "created_at"))),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     notes_repository: NotesRepository = Depends(
         NotesRepository.repository_factory)
 ):
     async with notes_repository:
-        notes = await notes_repository.get_all_notes_by_user_id(user_credentials.id)
-        if notes is None:
+        notes_page = await notes_repository.get_user_notes_page(user_credentials.id, page.limit, page.after, fields=fields)
+        if notes_page is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Notes not found")
-        return notes
+        notes, next_key = notes_page
+        return page_response(notes, next_key, page, Note, fields)
 
 
 @router_notes.post("/", status_code=status.HTTP_201_CREATED, description="Создает заметку для текущего пользователя")
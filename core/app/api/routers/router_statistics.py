@@ -1,14 +1,53 @@
+import logging
 import time
-from fastapi import APIRouter, HTTPException, Header, Depends, status
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import APIRouter, HTTPException, Header, Depends, Query, status
 from app.api.middlewares import get_user_from_request
-from app.api.models import UserCredentials, Statistic, StatisticAggregated, KpiSummary, Kpi, WorkTypes
+from app.api.models import UserCredentials, Statistic, StatisticAggregated, StatisticBatchItem, StatisticBatchResult, KpiSummary, Kpi, WorkTypes, StatisticBuckets, StatisticSeries
 from app.database.repositories import StatisticsRepository, UsersRepository
+from app.database.repositories.statistics_repository import kpi_summary_cache
+from app.database.replicas import use_primary
 from app.utils.kpi_calculator import KpiCalculator
+from app.utils.kpi_cache import month_key
 import datetime
 
 
 router_statistics = APIRouter(prefix="/statistics", tags=["Статистика"])
 
+STATISTICS_BATCH_MAX_SIZE = 1000
+STATISTICS_SERIES_MAX_BUCKETS = 1000
+
+
+def validate_statistic(record: Statistic, user_id: str) -> str | None:
+    """Возвращает текст ошибки, если запись нельзя сохранить"""
+    if record.user_id != user_id:
+        return "Not self account in statistic"
+    if record.work_type not in WorkTypes.__members__:
+        return "Unknown work type"
+    if record.count < 0:
+        return "Negative count"
+    return None
+
+
+def series_buckets(start: int, end: int, bucket: StatisticBuckets, zone: ZoneInfo) -> list[int]:
+    """Начала всех интервалов bucket в часовом поясе zone, пересекающихся с [start, end], в unix времени"""
+    moment = datetime.datetime.fromtimestamp(start, zone).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == StatisticBuckets.WEEK:
+        moment -= datetime.timedelta(days=moment.weekday())
+    elif bucket == StatisticBuckets.MONTH:
+        moment = moment.replace(day=1)
+    buckets = []
+    # NOTE: арифметика идет по местному времени, поэтому переходы на летнее время не сдвигают границы
+    while moment.timestamp() <= end and len(buckets) <= STATISTICS_SERIES_MAX_BUCKETS:
+        buckets.append(int(moment.timestamp()))
+        if bucket == StatisticBuckets.DAY:
+            moment += datetime.timedelta(days=1)
+        elif bucket == StatisticBuckets.WEEK:
+            moment += datetime.timedelta(weeks=1)
+        else:
+            moment = moment.replace(year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+    return buckets
+
 
 @router_statistics.post("/", status_code=status.HTTP_201_CREATED, description="Вносит новую запись об изменениях в статистике у текущего пользователя")
 async def add_statistic(
@@ -24,6 +63,30 @@ async def add_statistic(
         return record_id
 
 
+@router_statistics.post("/batch", status_code=status.HTTP_201_CREATED, description="Вносит пачку записей статистики текущего пользователя одним запросом; возвращает Id или ошибку для каждой записи")
+async def add_statistics_batch(
+    records: list[Statistic],
+    user_credentials: UserCredentials = Depends(get_user_from_request),
+    statistics_repository: StatisticsRepository = Depends(
+        StatisticsRepository.repository_factory)
+):
+    if len(records) > STATISTICS_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"No more than {STATISTICS_BATCH_MAX_SIZE} records per batch")
+    items = [StatisticBatchItem(index=index, error=validate_statistic(record, user_credentials.id))
+             for index, record in enumerate(records)]
+    valid_items = [item for item in items if item.error is None]
+    if valid_items:
+        async with statistics_repository:
+            record_ids = await statistics_repository.add_statistics_records([records[item.index] for item in valid_items])
+            if record_ids is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Unable to add statistics records")
+        for item, record_id in zip(valid_items, record_ids):
+            item.id = record_id
+    return StatisticBatchResult(inserted=len(valid_items), items=items)
+
+
 @router_statistics.get("/{user_id}/aggregated", status_code=status.HTTP_200_OK, description="Возвращает агрегированную информацию о статистике для текущего пользователя с фильтрами")
 async def get_user_statistics_aggregated(
     user_id: str,
@@ -46,6 +109,53 @@ async def get_user_statistics_aggregated(
         )
 
 
+@router_statistics.get("/{user_id}/series", status_code=status.HTTP_200_OK, description="Возвращает статистику текущего пользователя за период по дням, неделям или месяцам одним запросом: массив начал интервалов и массив сумм для каждого типа работ")
+async def get_user_statistics_series(
+    user_id: str,
+    start: int,
+    end: int,
+    bucket: StatisticBuckets = Query(default=StatisticBuckets.DAY, description="Размер интервала"),
+    timezone: str = Query(default="UTC", description="Часовой пояс IANA, в котором считаются границы интервалов, например Europe/Moscow"),
+    user_credentials: UserCredentials = Depends(get_user_from_request),
+    statistics_repository: StatisticsRepository = Depends(
+        StatisticsRepository.repository_factory)
+):
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="End is before start")
+    try:
+        buckets = series_buckets(start, end, bucket, ZoneInfo(timezone))
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown timezone")
+    if len(buckets) > STATISTICS_SERIES_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Too many buckets")
+    async with statistics_repository:
+        totals = await statistics_repository.get_statistics_series(user_credentials.id, start, end, bucket.value, timezone)
+        if totals is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load statistics")
+        positions = {bucket_start: i for i, bucket_start in enumerate(buckets)}
+        works = {work_type: [0] * len(buckets) for work_type in WorkTypes}
+        for (bucket_start, work_type), count in totals.items():
+            # NOTE: границы интервалов считают и Python, и PostgreSQL; при расхождении (например, в базах часовых поясов)
+            # сумма не попадает ни в один интервал, но ответ остается корректным для остальных
+            if bucket_start not in positions:
+                logging.warning(f"Интервал {bucket_start} ({bucket.value}, {timezone}) не совпал ни с одним из вычисленных, пропущено {count}")
+                continue
+            works[WorkTypes(work_type.value)][positions[bucket_start]] += count
+        return StatisticSeries(
+            user_id=user_credentials.id,
+            start=start,
+            end=end,
+            bucket=bucket,
+            timezone=timezone,
+            buckets=buckets,
+            works=works
+        )
+
+
 @router_statistics.get("/{user_id}/kpi", status_code=status.HTTP_200_OK)
 async def get_kpi(
     user_id: str,
@@ -55,44 +165,56 @@ async def get_kpi(
     users_repository: UsersRepository = Depends(
         UsersRepository.repository_factory)
 ):
-    async with users_repository:
-        user = await users_repository.get_user_by_id(user_id=user_credentials.id)
-        async with statistics_repository:
-            last_month_kpi = await statistics_repository.get_last_month_kpi(user_credentials.id)
-            if not last_month_kpi:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST, detail="Sequence contains no elements")
-            now = datetime.datetime.now()
-            first_day_of_month = datetime.datetime(now.year, now.month, 1)
-            start_unix = int(time.mktime(first_day_of_month.timetuple()))
-            if now.month == 12:
-                last_day_of_month = datetime.datetime(
-                    now.year + 1, 1, 1) - datetime.timedelta(days=1)
-            else:
-                last_day_of_month = datetime.datetime(
-                    now.year, now.month + 1, 1) - datetime.timedelta(days=1)
-            end_unix = int(time.mktime(last_day_of_month.timetuple()))
-            # NOTE: здесь start и end - это первое и последнее число текущего календарного месяца
-            data = await statistics_repository.get_statistics_in_period(user_credentials.id, start_unix, end_unix)
-            kpi_calc = KpiCalculator(
-                last_month_kpi.base_salary_percentage, last_month_kpi.kpi_level,
-                data.get('DEALS_RENT', 0),
-                data.get('DEALS_SALE', 0),
-                data.get('REGULAR_CONTRACTS', 0),
-                data.get('EXCLISIVE_CONTRACTS', 0),
-                data.get('CALLS', 0),
-                data.get('MEETS', 0),
-                data.get('FLYERS', 0),
-                data.get('SHOW', 0),
-                0,
-                user.type)
-            return KpiSummary(
-                last_month_kpi=last_month_kpi.kpi,
-                current_month_kpi=kpi_calc.calculate_kpi(),
-                level=last_month_kpi.kpi_level,
-                summary_deals_rent=data.get(WorkTypes.DEAL_RENT.name, 0),
-                summary_deals_sale=data.get(WorkTypes.DEAL_SALE.name, 0)
-            )
+    # NOTE: сводка меняется только при новой статистике или смене KPI, тогда запись в кеше сбрасывается
+    month = month_key(time.time())
+    cached = await kpi_summary_cache.get(user_credentials.id, month)
+    if cached is not None:
+        return KpiSummary.model_validate_json(cached)
+    # NOTE: сводка кешируется, поэтому считается по основной БД: с отстающей реплики в кеш попали бы
+    # суммы без только что добавленной статистики уже после сброса записи; а если запись сбросили
+    # во время расчета, set по прочитанному до него поколению сводку не запишет
+    generation = await kpi_summary_cache.generation(user_credentials.id, month)
+    with use_primary():
+        async with users_repository:
+            user = await users_repository.get_user_by_id(user_id=user_credentials.id)
+            async with statistics_repository:
+                last_month_kpi = await statistics_repository.get_last_month_kpi(user_credentials.id)
+                if not last_month_kpi:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST, detail="Sequence contains no elements")
+                now = datetime.datetime.now()
+                first_day_of_month = datetime.datetime(now.year, now.month, 1)
+                start_unix = int(time.mktime(first_day_of_month.timetuple()))
+                if now.month == 12:
+                    last_day_of_month = datetime.datetime(
+                        now.year + 1, 1, 1) - datetime.timedelta(days=1)
+                else:
+                    last_day_of_month = datetime.datetime(
+                        now.year, now.month + 1, 1) - datetime.timedelta(days=1)
+                end_unix = int(time.mktime(last_day_of_month.timetuple()))
+                # NOTE: здесь start и end - это первое и последнее число текущего календарного месяца
+                data = await statistics_repository.get_statistics_in_period(user_credentials.id, start_unix, end_unix)
+                kpi_calc = KpiCalculator(
+                    last_month_kpi.base_salary_percentage, last_month_kpi.kpi_level,
+                    data.get('DEALS_RENT', 0),
+                    data.get('DEALS_SALE', 0),
+                    data.get('REGULAR_CONTRACTS', 0),
+                    data.get('EXCLISIVE_CONTRACTS', 0),
+                    data.get('CALLS', 0),
+                    data.get('MEETS', 0),
+                    data.get('FLYERS', 0),
+                    data.get('SHOW', 0),
+                    0,
+                    user.type)
+                summary = KpiSummary(
+                    last_month_kpi=last_month_kpi.kpi,
+                    current_month_kpi=kpi_calc.calculate_kpi(),
+                    level=last_month_kpi.kpi_level,
+                    summary_deals_rent=data.get(WorkTypes.DEAL_RENT.name, 0),
+                    summary_deals_sale=data.get(WorkTypes.DEAL_SALE.name, 0)
+                )
+                await kpi_summary_cache.set(user_credentials.id, month, summary.model_dump_json(), generation)
+                return summary
 
 
 @router_statistics.put("/{user_id}/kpi", status_code=status.HTTP_200_OK)
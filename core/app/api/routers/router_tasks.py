@@ -2,36 +2,44 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from app.database.repositories import TasksRepository
 from app.api.models import Task, UserCredentials
 from app.api.middlewares import get_user_from_request
+from app.utils.pagination import PageParams, get_page_params, page_response
+from app.utils.fieldsets import fieldset
 
 router_tasks = APIRouter(prefix="/tasks", tags=["Задачи"])
 
 
-@router_tasks.get("/", status_code=status.HTTP_200_OK, description="Возвращает все задачи текущего пользователя")
+@router_tasks.get("/", status_code=status.HTTP_200_OK, description="Возвращает невыполненные задачи текущего пользователя от новых к старым: постранично, если передан limit или cursor, иначе весь список массивом")
 async def get_tasks(
+    page: PageParams = Depends(get_page_params),
+    fields: list[str] | None = Depends(fieldset(Task, ("id", "created_at"))),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     tasks_repository: TasksRepository = Depends(
         TasksRepository.repository_factory)
 ):
     async with tasks_repository:
-        tasks = await tasks_repository.get_all_tasks_by_user_id(user_credentials.id, False)
-        if tasks is None:
+        tasks_page = await tasks_repository.get_user_tasks_page(user_credentials.id, page.limit, page.after, False, fields=fields)
+        if tasks_page is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Tasks not found")
-        return tasks
+        tasks, next_key = tasks_page
+        return page_response(tasks, next_key, page, Task, fields)
 
 
-@router_tasks.get("/completed", status_code=status.HTTP_200_OK, description="Возвращает только выполненные задачи текущего пользователя")
+@router_tasks.get("/completed", status_code=status.HTTP_200_OK, description="Возвращает только выполненные задачи текущего пользователя от новых к старым: постранично, если передан limit или cursor, иначе весь список массивом")
 async def get_completed_tasks(
+    page: PageParams = Depends(get_page_params),
+    fields: list[str] | None = Depends(fieldset(Task, ("id", "created_at"))),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     tasks_repository: TasksRepository = Depends(
         TasksRepository.repository_factory)
 ):
     async with tasks_repository:
-        tasks = await tasks_repository.get_all_tasks_by_user_id(user_credentials.id, True)
-        if tasks is None:
+        tasks_page = await tasks_repository.get_user_tasks_page(user_credentials.id, page.limit, page.after, True, fields=fields)
+        if tasks_page is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Completed tasks not found")
-        return tasks
+        tasks, next_key = tasks_page
+        return page_response(tasks, next_key, page, Task, fields)
 
 
 @router_tasks.post("/", status_code=status.HTTP_201_CREATED, description="Создает задачу для текущего пользователя")
@@ -2,13 +2,17 @@ import time
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, Depends, Query, status
 from app.database.repositories import TeamsRepository, UsersRepository, StatisticsRepository, AddressesRepository, CallsRepository
-from app.api.models import Team, UserTeam, UserStatuses
+from app.api.models import Team, UserTeam, UserStatuses, Kpi
+from app.database.models import UserStatusesOrm
 from app.api.middlewares import get_user_from_request
 from app.api.models import UserCredentials
 from app.common.models import *
 
 router_teams = APIRouter(prefix="/teams", tags=["Команды"])
 
+TEAM_MEMBER_ITEMS_LIMIT = 20
+TEAM_MEMBER_ITEMS_MAX_LIMIT = 500
+
 
 @router_teams.post("/", status_code=status.HTTP_201_CREATED, description="Создает команду и делает текущего пользователя ее Owner")
 async def create_team(
@@ -100,11 +104,42 @@ async def set_user_role_in_team(
         return {"detail": "Role changed successfully"}
 
 
-@router_teams.get("/", status_code=status.HTTP_200_OK, description="Возвращает полную информацию обо всех командах, в которых состоит текущий пользователь; также об их участниках и статистиках (пока только статистики), если текущий пользователь является Owner")
+@router_teams.put("/{team_id}/kpi", status_code=status.HTTP_200_OK, description="Устанавливает KPI нескольким участникам команды одним запросом; для этого действия текущий пользователь должен являться Owner в этой команде")
+async def set_team_kpi(
+    team_id: str,
+    kpis: list[Kpi],
+    user_credentials: UserCredentials = Depends(get_user_from_request),
+    teams_repository: TeamsRepository = Depends(
+        TeamsRepository.repository_factory),
+    statistics_repository: StatisticsRepository = Depends(
+        StatisticsRepository.repository_factory)
+):
+    async with teams_repository:
+        roles = await teams_repository.get_team_roles(team_id)
+        if not roles or roles.get(user_credentials.id) != UserStatusesOrm.OWNER:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Team not found!")
+        strangers = sorted({kpi.user_id for kpi in kpis} - roles.keys())
+        if strangers:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Not team members: {', '.join(strangers)}")
+        async with statistics_repository:
+            success = await statistics_repository.set_kpi_levels(kpis)
+            if not success:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Unable to set KPI")
+            return {"detail": "KPI set successfully"}
+
+
+@router_teams.get("/", status_code=status.HTTP_200_OK, description="Возвращает полную информацию обо всех командах, в которых состоит текущий пользователь; также об их участниках, статистиках, звонках и адресах, если текущий пользователь является Owner")
 async def get_my_teams(
     show_stats: bool = Query(default=False),
     show_addresses: bool = Query(default=False),
     show_calls: bool = Query(default=False),
+    summary_only: bool = Query(default=False, description="Вместо списков звонков и адресов вернуть только сводку по ним"),
+    items_limit: int = Query(default=TEAM_MEMBER_ITEMS_LIMIT, ge=1, le=TEAM_MEMBER_ITEMS_MAX_LIMIT, description="Сколько последних звонков и адресов вернуть для каждого участника"),
+    date_start: int | None = Query(default=None, description="Начало периода (unix время) для звонков и адресов"),
+    date_end: int | None = Query(default=None, description="Конец периода (unix время) для звонков и адресов"),
     user_credentials: UserCredentials = Depends(get_user_from_request),
     teams_repository: TeamsRepository = Depends(
         TeamsRepository.repository_factory),
@@ -120,6 +155,15 @@ async def get_my_teams(
         if teams is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="No teams found")
+        # NOTE: статистики, KPI, звонки и адреса участников видит только Owner команды, остальным они не заполняются
+        owned_teams = [
+            t for t in teams
+            if any(m.user.id == user_credentials.id and m.role == UserStatuses.OWNER for m in t.members)
+        ]
+        # NOTE: данные участников всех таких команд загружаются одним запросом на каждый тип данных
+        member_ids = list({m.user.id for t in owned_teams for m in t.members})
+        if not member_ids:
+            return teams
         if show_stats:
             async with statistics_repository:
                 now = datetime.now()
@@ -133,16 +177,49 @@ async def get_my_teams(
                         now.year, now.month + 1, 1) - timedelta(days=1)
                 end_unix = int(time.mktime(last_day_of_month.timetuple()))
                 # NOTE: здесь start и end - это первое и последнее число текущего календарного месяца
-                for t in teams:
+                stats = await statistics_repository.get_users_statistics_in_period(member_ids, start_unix, end_unix)
+                kpis = await statistics_repository.get_last_month_kpis(member_ids)
+                if stats is None or kpis is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load team statistics")
+                for t in owned_teams:
                     for m in t.members:
-                        m.stats = await statistics_repository.get_statistics_in_period(m.user.id, start_unix, end_unix)
-                        m.kpi = await statistics_repository.get_last_month_kpi(m.user.id)
+                        m.stats = stats.get(m.user.id, {})
+                        m.kpi = kpis.get(m.user.id)
         if show_calls:
             async with calls_repository:
-                # TODO: потом дописать
-                ...
+                if summary_only:
+                    summaries = await calls_repository.get_calls_summary_by_user_ids(member_ids, date_start, date_end)
+                    if summaries is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load team calls")
+                    for t in owned_teams:
+                        for m in t.members:
+                            m.calls_summary = summaries[m.user.id]
+                else:
+                    calls = await calls_repository.get_last_calls_by_user_ids(member_ids, items_limit, date_start, date_end)
+                    if calls is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load team calls")
+                    for t in owned_teams:
+                        for m in t.members:
+                            m.calls = [Call.model_validate(c) for c in calls[m.user.id]]
         if show_addresses:
             async with address_repository:
-                # TODO: потом дописать
-                ...
+                if summary_only:
+                    summaries = await address_repository.get_addresses_summary_by_user_ids(member_ids, date_start, date_end)
+                    if summaries is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load team addresses")
+                    for t in owned_teams:
+                        for m in t.members:
+                            m.addresses_summary = summaries[m.user.id]
+                else:
+                    addresses = await address_repository.get_last_addresses_by_user_ids(member_ids, items_limit, date_start, date_end)
+                    if addresses is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to load team addresses")
+                    for t in owned_teams:
+                        for m in t.members:
+                            m.addresses = [Address.model_validate(a) for a in addresses[m.user.id]]
         return teams
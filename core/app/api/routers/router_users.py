@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, UploadFile, status
 from fastapi.responses import RedirectResponse
-from app.api.models import User, UserCredentials
+from app.api.models import User, UserCredentials, AuthPrivileges
 from app.database import BaseRepository, UsersRepository, FilesRepository
-from app.api.middlewares import get_user_from_request
+from app.api.middlewares import get_user_from_request, token_cache
 from app.utils.minio_client import MinioClient
 
 
@@ -48,10 +48,31 @@ async def set_avatar(
         FilesRepository.repository_factory),
     minio_client: MinioClient = Depends(MinioClient.minio_client_factory)
 ):
+    minio_client.upload_file(user_credentials.id, file)
     async with files_repository:
-        minio_client.upload_file(user_credentials.id, file)
         new_avatar_file_id = await files_repository.add_file(file.filename, user_credentials.id, user_credentials.id, user_credentials.id)
         async with user_repository:
             if await user_repository.update_avatar_only(user_credentials.id, new_avatar_file_id):
                 return new_avatar_file_id
             return None
+
+
+@router_users.delete("/token_cache", status_code=status.HTTP_200_OK, description="Отзывает текущий токен в кеше проверки; вызывается клиентом при выходе из аккаунта")
+async def invalidate_my_token_cache(
+    token_authorization: str = Header(alias='token-authorization'),
+    user_credentials: UserCredentials = Depends(get_user_from_request)
+):
+    await token_cache.revoke(token_authorization)
+    return {"detail": "Token cache invalidated"}
+
+
+@router_users.delete("/{user_id}/token_cache", status_code=status.HTTP_200_OK, description="Сбрасывает кеш проверки всех токенов пользователя и отключает их локальную проверку (например, при деактивации); только для ADMIN")
+async def invalidate_user_token_cache(
+    user_id: str,
+    user_credentials: UserCredentials = Depends(get_user_from_request)
+):
+    if user_credentials.privileges != AuthPrivileges.ADMIN and user_id != user_credentials.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
+    await token_cache.revoke_user(user_id)
+    return {"detail": "Token cache invalidated"}
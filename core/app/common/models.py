@@ -8,6 +8,8 @@ class UserWithRole(BaseModel):
     stats: Dict[WorkTypes | str, int] = {}
     addresses: List[Address] = []
     calls: List[Call] = []
+    calls_summary: Optional[CallsSummary] = None
+    addresses_summary: Optional[AddressesSummary] = None
     kpi: Kpi = None
     role: UserStatuses | str
 
@@ -1,3 +1,5 @@
 from .orm import *
 from .models import *
 from .repositories import BaseRepository, FilesRepository, UsersRepository
+from .session_scope import session_scope, current_session_scope
+from .warmup import warmup
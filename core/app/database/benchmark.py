@@ -0,0 +1,137 @@
+"""
+Микробенчмарк горячих запросов: CPU процесса на один запрос для обычного select() (строится и
+получает ключ кеша заново при каждом вызове) и для lambda statement, которым пользуются репозитории.
+
+Запуск из директории core:
+    python -m app.database.benchmark [iterations]
+"""
+import asyncio
+import logging
+import sys
+import time
+from typing import Callable
+from sqlalchemy import select, func, union_all, and_, or_, lambda_stmt
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Executable
+from app.database.orm import async_engine, new_session
+from app.database.models import *
+from app.database.repositories import StatisticsRepository, TeamsRepository, CallsRepository, AddressesRepository
+from app.database.repositories.statistics_repository import day_start, SECONDS_IN_DAY
+from app.utils.pagination import PAGE_SIZE_DEFAULT
+
+
+ITERATIONS_DEFAULT = 1000
+USER_ID = "-"
+PERIOD_START, PERIOD_END = 0, 2 ** 31 - 1
+
+
+def plain_teams_by_user(user_id: str) -> Executable:
+    my_team, member = aliased(UserTeamOrm), aliased(UserTeamOrm)
+    return (
+        select(TeamOrm, member.role, UserOrm)
+        .join(my_team, my_team.team_id == TeamOrm.id)
+        .join(member, member.team_id == TeamOrm.id)
+        .join(UserOrm, UserOrm.id == member.user_id)
+        .where(my_team.user_id == user_id)
+        .order_by(TeamOrm.created_at, TeamOrm.id)
+    )
+
+
+def cached_teams_by_user(user_id: str) -> Executable:
+    return TeamsRepository.teams_by_user_query(user_id)
+
+
+def plain_statistics_in_period(user_id: str) -> Executable:
+    first_day = day_start(PERIOD_START + SECONDS_IN_DAY - 1)
+    last_day = day_start(PERIOD_END + 1) - SECONDS_IN_DAY
+    counts = union_all(
+        select(StatisticDailyOrm.user_id, StatisticDailyOrm.work_type, StatisticDailyOrm.count)
+        .where(StatisticDailyOrm.user_id.in_([user_id]))
+        .where(StatisticDailyOrm.day >= first_day, StatisticDailyOrm.day <= last_day),
+        select(StatisticOrm.user_id, StatisticOrm.work_type, StatisticOrm.count)
+        .where(StatisticOrm.user_id.in_([user_id]))
+        .where(or_(
+            and_(StatisticOrm.date_time >= PERIOD_START, StatisticOrm.date_time < first_day),
+            and_(StatisticOrm.date_time >= last_day + SECONDS_IN_DAY, StatisticOrm.date_time <= PERIOD_END)
+        ))
+    ).subquery()
+    return (
+        select(counts.c.user_id, counts.c.work_type, func.sum(counts.c.count))
+        .group_by(counts.c.user_id, counts.c.work_type)
+    )
+
+
+def cached_statistics_in_period(user_id: str) -> Executable:
+    return StatisticsRepository.period_totals_query([user_id], PERIOD_START, PERIOD_END)
+
+
+def plain_calls_page(user_id: str) -> Executable:
+    return (
+        select(CallOrm).where(CallOrm.user_id == user_id)
+        .order_by(CallOrm.date_time.desc(), CallOrm.id.desc()).limit(PAGE_SIZE_DEFAULT + 1)
+    )
+
+
+def cached_calls_page(user_id: str) -> Executable:
+    return CallsRepository.calls_page_query(user_id, PAGE_SIZE_DEFAULT)
+
+
+def plain_addresses_page(user_id: str) -> Executable:
+    return (
+        select(AddressOrm).where(AddressOrm.user_id == user_id)
+        .where(AddressOrm.date_time >= PERIOD_START).where(AddressOrm.date_time <= PERIOD_END)
+        .order_by(AddressOrm.date_time.desc(), AddressOrm.id.desc()).limit(PAGE_SIZE_DEFAULT + 1)
+    )
+
+
+def cached_addresses_page(user_id: str) -> Executable:
+    return AddressesRepository.addresses_page_query(user_id, PAGE_SIZE_DEFAULT, None, PERIOD_START, PERIOD_END)
+
+
+# NOTE: UsersRepository.get_user_by_id использует session.get: его SELECT по первичному ключу SQLAlchemy
+# уже кеширует сам (как lambda statement), а в сессии запроса повторный get вообще не идет в БД
+def plain_user_by_id(user_id: str) -> Executable:
+    return select(UserOrm).where(UserOrm.id == user_id)
+
+
+def cached_user_by_id(user_id: str) -> Executable:
+    return lambda_stmt(lambda: select(UserOrm).where(UserOrm.id == user_id))
+
+
+BENCHMARKS: dict[str, tuple[Callable[[str], Executable], Callable[[str], Executable]]] = {
+    "teams_by_user": (plain_teams_by_user, cached_teams_by_user),
+    "statistics_in_period": (plain_statistics_in_period, cached_statistics_in_period),
+    "calls_page": (plain_calls_page, cached_calls_page),
+    "addresses_page": (plain_addresses_page, cached_addresses_page),
+    "user_by_id": (plain_user_by_id, cached_user_by_id),
+}
+
+
+async def cpu_per_query(build: Callable[[str], Executable], iterations: int) -> float:
+    """CPU процесса (мкс) на построение и выполнение одного запроса; соединение одно на все итерации"""
+    async with new_session() as session:
+        # NOTE: первый вызов компилирует SQL и готовит statement, в замер он не входит
+        await session.execute(build(USER_ID))
+        started = time.process_time()
+        for i in range(iterations):
+            # NOTE: разные значения параметров, чтобы не мерить попадание в кеш одного и того же объекта
+            result = await session.execute(build(f"{USER_ID}{i}"))
+            result.all()
+        return (time.process_time() - started) / iterations * 1e6
+
+
+async def main(iterations: int) -> int:
+    try:
+        logging.info(f"{'query':<24}{'select(), мкс':>16}{'lambda, мкс':>16}{'ускорение':>12}")
+        for name, (plain, cached) in BENCHMARKS.items():
+            plain_us = await cpu_per_query(plain, iterations)
+            cached_us = await cpu_per_query(cached, iterations)
+            logging.info(f"{name:<24}{plain_us:>16.0f}{cached_us:>16.0f}{plain_us / cached_us:>11.1f}x")
+        return 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS_DEFAULT)))
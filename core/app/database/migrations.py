@@ -0,0 +1,249 @@
+"""
+Миграции для уже работающей базы данных (create_all создает только отсутствующие таблицы).
+
+Запуск из директории core:
+    python -m app.database.migrations indexes   - создать индексы CONCURRENTLY, не блокируя запись
+    python -m app.database.migrations explain   - проверить планы горячих запросов (нет ли Seq Scan)
+    python -m app.database.migrations rollup    - создать statistics_daily и пересчитать ее по statistics
+    python -m app.database.migrations partition - секционировать statistics, addresses и calls по месяцам (с переносом строк)
+    python -m app.database.migrations partitions [N]       - создать секции текущего и N следующих месяцев (по расписанию)
+    python -m app.database.migrations detach YYYY-MM [drop] - отсоединить (drop - удалить) секции месяцев раньше YYYY-MM
+    python -m app.database.migrations attach TABLE YYYY-MM  - вернуть отсоединенную секцию месяца таблицы TABLE
+"""
+import asyncio
+import json
+import logging
+import sys
+from sqlalchemy import text, Index
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database.orm import async_engine, config
+from app.database.models import *
+from app.database.partitions import PARTITIONED_TABLES, is_partitioned, get_partitions, \
+    partition_table, ensure_partitions, detach_partitions_before, reattach_month_partition, parse_month, \
+    default_partition_rows, default_partition_name
+from app.database.repositories import StatisticsRepository, AddressesRepository, CallsRepository, NotesRepository, \
+    TasksRepository, FilesRepository, TeamsRepository, UsersRepository
+from app.utils.pagination import PAGE_SIZE_DEFAULT
+
+
+HOT_TABLES = [StatisticOrm, AddressOrm, CallOrm, NoteOrm, TaskOrm, FilesAccessOrm, UserTeamOrm]
+
+
+async def create_indexes_concurrently():
+    """Создает индексы моделей через CREATE INDEX CONCURRENTLY; недостроенные (invalid) индексы пересоздает"""
+    # NOTE: CONCURRENTLY нельзя выполнять внутри транзакции, поэтому AUTOCOMMIT
+    async with async_engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for table in HOT_TABLES:
+            partitioned = await is_partitioned(connection, table.__table__)
+            for index in table.__table__.indexes:
+                if partitioned:
+                    await create_partitioned_index(connection, index)
+                    continue
+                await drop_invalid_index(connection, index.table.schema, index.name)
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(
+                    dialect=async_engine.dialect))
+                ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+                logging.info(ddl)
+                await connection.execute(text(ddl))
+
+
+async def create_partitioned_index(connection: AsyncConnection, index: Index):
+    """
+    У секционированной таблицы CONCURRENTLY нельзя: индекс создается на самой таблице (ON ONLY, без секций),
+    на каждой секции строится CONCURRENTLY и присоединяется к нему. Индекс становится valid, когда присоединены все.
+    """
+    table = index.table
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=async_engine.dialect))
+    on_table = f" ON {table.fullname} "
+    await connection.execute(text(ddl.replace(on_table, f" ON ONLY {table.fullname} ", 1)))
+    for partition in await get_partitions(connection, table):
+        result = await connection.execute(text(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_inherits i
+                JOIN pg_index x ON x.indexrelid = i.inhrelid
+                WHERE i.inhparent = to_regclass(:index) AND x.indrelid = to_regclass(:partition)
+            )
+            """
+        ), {"index": f"{table.schema}.{index.name}", "partition": f"{table.schema}.{partition}"})
+        if result.scalar():
+            continue
+        partition_index = f"{partition}_{index.name}"
+        await drop_invalid_index(connection, table.schema, partition_index)
+        partition_ddl = ddl.replace(f" {index.name}{on_table}", f" {partition_index} ON {table.schema}.{partition} ", 1)
+        partition_ddl = partition_ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        logging.info(partition_ddl)
+        await connection.execute(text(partition_ddl))
+        await connection.execute(text(
+            f'ALTER INDEX "{table.schema}"."{index.name}" ATTACH PARTITION "{table.schema}"."{partition_index}"'
+        ))
+
+
+async def drop_invalid_index(connection: AsyncConnection, schema: str, name: str):
+    """Удаляет индекс, оставшийся invalid после прерванного CREATE INDEX CONCURRENTLY"""
+    result = await connection.execute(text(
+        """
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relname = :name
+        """
+    ), {"schema": schema, "name": name})
+    if result.scalar():
+        logging.warning(f"Индекс {schema}.{name} invalid, пересоздаем")
+        await connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{name}"'))
+
+
+async def backfill_statistics_rollup():
+    """Создает statistics_daily, если ее нет, и пересчитывает суточные суммы по всей statistics"""
+    async with async_engine.begin() as connection:
+        await connection.run_sync(StatisticDailyOrm.__table__.create, checkfirst=True)
+        # NOTE: SHARE блокирует только запись в statistics, чтобы новые записи не потерялись между пересчетом и upsert
+        await connection.execute(text("LOCK TABLE public.statistics IN SHARE MODE"))
+        await connection.execute(text(
+            """
+            INSERT INTO public.statistics_daily (user_id, day, work_type, count)
+            SELECT user_id, date_time - date_time % 86400, work_type, sum(count)
+            FROM public.statistics
+            GROUP BY user_id, date_time - date_time % 86400, work_type
+            ON CONFLICT (user_id, day, work_type) DO UPDATE SET count = excluded.count
+            """
+        ))
+        await connection.execute(text(
+            """
+            DELETE FROM public.statistics_daily d
+            WHERE NOT EXISTS (
+                SELECT 1 FROM public.statistics s
+                WHERE s.user_id = d.user_id AND s.work_type = d.work_type
+                AND s.date_time >= d.day AND s.date_time < d.day + 86400
+            )
+            """
+        ))
+
+
+async def check_default_partitions(connection: AsyncConnection) -> bool:
+    """Сообщает о строках в DEFAULT секциях: у их месяцев нет присоединенной секции, и запросы по ним читают DEFAULT целиком"""
+    found = False
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(connection, table):
+            continue
+        for month, count in (await default_partition_rows(connection, table)).items():
+            logging.warning(f"{table.schema}.{default_partition_name(table)}: {count} строк за {month}, секции этого месяца нет")
+            found = True
+    return found
+
+
+async def partition_tables() -> list[str]:
+    """Секционирует по месяцам еще не секционированные PARTITIONED_TABLES, каждую в своей транзакции"""
+    partitioned = []
+    for table in PARTITIONED_TABLES:
+        async with async_engine.begin() as connection:
+            if await partition_table(connection, table, config.partitions_ahead):
+                partitioned.append(table.fullname)
+    return partitioned
+
+
+def hot_queries() -> dict:
+    """
+    Запросы горячих путей, построенные теми же построителями, что используют репозитории,
+    во всех формах: первая и следующая страница, с фильтром по дате и без, суммы по суткам и по сырым записям
+    """
+    user_id, user_ids, file_id, start, end = "-", ["-", "--"], "-", 0, 2 ** 31 - 1
+    after, limit, fields = (end, "-"), PAGE_SIZE_DEFAULT, ["id", "date_time"]
+    return {
+        "statistics_in_period": StatisticsRepository.period_totals_query(user_ids, start, end),
+        "statistics_in_period_raw": StatisticsRepository.period_totals_query(user_ids, start, start),
+        "statistics_series": StatisticsRepository.statistics_series_query(user_id, start, end, "day", "UTC"),
+        "statistics_series_raw": StatisticsRepository.statistics_series_query(user_id, start, end, "week", "Europe/Moscow"),
+        "last_month_kpis": StatisticsRepository.last_month_kpis_query(user_ids),
+        "addresses_list": AddressesRepository.addresses_page_query(user_id, None, None, start, end),
+        "addresses_page": AddressesRepository.addresses_page_query(user_id, limit),
+        "addresses_next_page": AddressesRepository.addresses_page_query(user_id, limit, after, start, end, fields),
+        "last_addresses_by_users": AddressesRepository.last_addresses_query(user_ids, limit, start, end),
+        "addresses_summary_by_users": AddressesRepository.addresses_summary_query(user_ids, start, end),
+        "calls_list": CallsRepository.calls_page_query(user_id, None),
+        "calls_page": CallsRepository.calls_page_query(user_id, limit),
+        "calls_next_page": CallsRepository.calls_page_query(user_id, limit, after, fields),
+        "last_calls_by_users": CallsRepository.last_calls_query(user_ids, limit, start, end),
+        "calls_summary_by_users": CallsRepository.calls_summary_query(user_ids, start, end),
+        "notes_page": NotesRepository.notes_page_query(user_id, limit),
+        "notes_next_page": NotesRepository.notes_page_query(user_id, limit, after),
+        "tasks_page": TasksRepository.tasks_page_query(user_id, limit),
+        "tasks_next_page": TasksRepository.tasks_page_query(user_id, limit, after, True),
+        "files_access_check": FilesRepository.access_check_query(FileAccessModeOrm.WRITE, user_id, file_id),
+        "teams_by_user": TeamsRepository.teams_by_user_query(user_id),
+        "token_owner": UsersRepository.token_owner_query("-", user_id),
+    }
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """Возвращает таблицы, которые в плане читаются последовательным сканированием"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def explain_hot_queries() -> dict[str, list[str]]:
+    """Снимает EXPLAIN горячих запросов; возвращает запросы, в планах которых остался Seq Scan"""
+    regressions = {}
+    async with async_engine.connect() as connection:
+        # NOTE: на маленьких таблицах планировщик и так выберет Seq Scan; проверяем, что индекс вообще применим
+        await connection.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, query in hot_queries().items():
+            compiled = query.compile(dialect=async_engine.dialect,
+                                     compile_kwargs={"literal_binds": True})
+            result = await connection.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+            plan = result.scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            seq_scans = find_seq_scans(plan[0]["Plan"])
+            logging.info(f"{name}: {json.dumps(plan[0]['Plan'], ensure_ascii=False)}")
+            if seq_scans:
+                regressions[name] = seq_scans
+        await connection.rollback()
+    return regressions
+
+
+async def main(command: str, args: list[str]) -> int:
+    try:
+        if command == "indexes":
+            await create_indexes_concurrently()
+        elif command == "rollup":
+            await backfill_statistics_rollup()
+        elif command == "partition":
+            await partition_tables()
+        elif command == "partitions":
+            async with async_engine.begin() as connection:
+                await ensure_partitions(connection, int(args[0]) if args else config.partitions_ahead)
+                return 1 if await check_default_partitions(connection) else 0
+        elif command == "detach" and args:
+            async with async_engine.begin() as connection:
+                await detach_partitions_before(connection, parse_month(args[0]), drop=args[1:] == ["drop"])
+        elif command == "attach" and len(args) == 2:
+            table = next((table for table in PARTITIONED_TABLES if table.name == args[0]), None)
+            if table is None:
+                logging.error(f"Таблица {args[0]} не секционируется")
+                return 2
+            async with async_engine.begin() as connection:
+                await reattach_month_partition(connection, table, parse_month(args[1]))
+        elif command == "explain":
+            regressions = await explain_hot_queries()
+            for name, tables in regressions.items():
+                logging.error(f"{name}: Seq Scan по {', '.join(tables)}")
+            return 1 if regressions else 0
+        else:
+            logging.error(__doc__)
+            return 2
+        return 0
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "", sys.argv[2:])))
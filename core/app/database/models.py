@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import DateTime, ForeignKey, String, Float, Boolean, Enum as SqlEnum, Integer, Date
+from sqlalchemy import DateTime, ForeignKey, String, Float, Boolean, Enum as SqlEnum, Integer, Date, Index
 from enum import Enum
 import uuid
 import time
@@ -134,7 +134,10 @@ class UserOrm(BaseModelOrm):
 
 class NoteOrm(BaseModelOrm):
     __tablename__ = "notes"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_notes_user_id_created_at', 'user_id', 'created_at'),
+        {'schema': 'public'}
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
@@ -149,7 +152,10 @@ class NoteOrm(BaseModelOrm):
 
 class TaskOrm(BaseModelOrm):
     __tablename__ = "tasks"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_tasks_user_id_is_completed_created_at', 'user_id', 'is_completed', 'created_at'),
+        {'schema': 'public'}
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
@@ -179,7 +185,10 @@ class TeamOrm(BaseModelOrm):
 
 class UserTeamOrm(BaseModelOrm):
     __tablename__ = "user_teams"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_user_teams_user_id', 'user_id'),
+        {'schema': 'public'}
+    )
 
     team_id: Mapped[str] = mapped_column(ForeignKey(
         TeamOrm.id, ondelete="CASCADE"), primary_key=True)
@@ -193,7 +202,10 @@ class UserTeamOrm(BaseModelOrm):
 
 class FilesAccessOrm(BaseModelOrm):
     __tablename__ = 'files_access'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_files_access_file_id_user_id', 'file_id', 'user_id', postgresql_include=['file_access_mode']),
+        {'schema': 'public'}
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
@@ -206,14 +218,22 @@ class FilesAccessOrm(BaseModelOrm):
 
 class StatisticOrm(BaseModelOrm):
     __tablename__ = "statistics"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_statistics_user_id_date_time', 'user_id', 'date_time', postgresql_include=['work_type', 'count']),
+        {'schema': 'public', 'postgresql_partition_by': 'RANGE (date_time)'}
+    )
+    # NOTE: ключ секционирования обязан входить в первичный ключ таблицы, но для ORM запись по-прежнему определяется id.
+    # Поэтому в statistics, addresses и calls БД не проверяет уникальность одного id (первичный ключ - (id, date_time));
+    # ее гарантирует приложение: id всегда uuid4 сервиса (id из запроса репозитории заменяют), а перенос строк
+    # между секциями в partitions.py не создает копий
+    __mapper_args__ = {'primary_key': ['id']}
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(
         ForeignKey(UserOrm.id, ondelete="CASCADE"))
     date_time: Mapped[int] = mapped_column(
-        Integer, default=int(datetime.datetime.now().timestamp()))
+        Integer, primary_key=True, default=int(datetime.datetime.now().timestamp()))
     work_type: Mapped[WorkTypesOrm] = mapped_column(SqlEnum(WorkTypesOrm))
     comment: Mapped[str | None] = mapped_column(String, default=None)
     count: Mapped[int] = mapped_column(Integer, default=0)
@@ -223,9 +243,26 @@ class StatisticOrm(BaseModelOrm):
     #     "UserOrm", back_populates="statistics")
 
 
+class StatisticDailyOrm(BaseModelOrm):
+    """Суммы statistics по пользователю, дню (начало суток UTC, unix) и виду работы"""
+    __tablename__ = "statistics_daily"
+    __table_args__ = {'schema': 'public'}
+
+    user_id: Mapped[str] = mapped_column(
+        ForeignKey(UserOrm.id, ondelete="CASCADE"), primary_key=True)
+    day: Mapped[int] = mapped_column(Integer, primary_key=True)
+    work_type: Mapped[WorkTypesOrm] = mapped_column(
+        SqlEnum(WorkTypesOrm), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class AddressOrm(BaseModelOrm):
     __tablename__ = "addresses"
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_addresses_user_id_date_time', 'user_id', 'date_time'),
+        {'schema': 'public', 'postgresql_partition_by': 'RANGE (date_time)'}
+    )
+    __mapper_args__ = {'primary_key': ['id']}
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
@@ -234,7 +271,7 @@ class AddressOrm(BaseModelOrm):
     address: Mapped[str] = mapped_column(String, default="")
     lat: Mapped[float] = mapped_column(Float, default=0.0)
     lon: Mapped[float] = mapped_column(Float, default=0.0)
-    date_time: Mapped[int] = mapped_column(Integer, default=0)
+    date_time: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
 
     # user: Mapped["UserOrm"] = relationship(
     #     "UserOrm", back_populates="addresses")
@@ -255,13 +292,17 @@ class KpiOrm(BaseModelOrm):
 
 class CallOrm(BaseModelOrm):
     __tablename__ = 'calls'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        Index('ix_calls_user_id_date_time', 'user_id', 'date_time'),
+        {'schema': 'public', 'postgresql_partition_by': 'RANGE (date_time)'}
+    )
+    __mapper_args__ = {'primary_key': ['id']}
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(
         ForeignKey(UserOrm.id, ondelete="CASCADE"))
-    date_time: Mapped[int] = mapped_column(Integer)
+    date_time: Mapped[int] = mapped_column(Integer, primary_key=True)
     phone_number: Mapped[str] = mapped_column(String)
     contact_name: Mapped[str] = mapped_column(String)
     length_seconds: Mapped[int] = mapped_column(Integer)
@@ -1,28 +1,79 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncConnection
 from sqlalchemy import text
 from sqlalchemy.engine.url import URL
+import uuid
 from app.database.models import *
-from app.toml_helper import load_data_from_toml
+from app.database.pool import InstrumentedQueuePool, InstrumentedNullPool, instrument_engine, pool_metrics
+from app.database.replicas import RoutingSession, replica_set
+from app.toml_helper import get_settings, DatabasePoolModes
 
 
-config = load_data_from_toml()['database']
+config = get_settings().database
 url = URL.create(
     drivername="postgresql+asyncpg",
-    username=config['postgres_user'],
-    password=config['postgres_password'],
-    host=config['postgres_host'],
-    port=int(config['postgres_port']),
-    database=config['postgres_db']
+    username=config.postgres_user,
+    password=config.postgres_password,
+    host=config.postgres_host,
+    port=config.postgres_port,
+    database=config.postgres_db
 )
 
 
-async_engine = create_async_engine(
+def engine_options(config) -> dict:
+    """Параметры пула соединений в зависимости от режима из настроек"""
+    if config.pool_mode == DatabasePoolModes.PGBOUNCER:
+        return {
+            "poolclass": InstrumentedNullPool,
+            "pool_pre_ping": config.pool_pre_ping,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+            }
+        }
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config.pool_size,
+        "max_overflow": config.max_overflow,
+        "pool_timeout": config.pool_timeout,
+        "pool_recycle": config.pool_recycle,
+        "pool_pre_ping": config.pool_pre_ping,
+        "connect_args": {
+            "prepared_statement_cache_size": config.prepared_statement_cache_size
+        }
+    }
+
+
+async_engine = instrument_engine(create_async_engine(
     url,
     echo=False,
-    pool_size=5,
-    max_overflow=3
+    **engine_options(config)
+), "primary")
+
+
+def replica_url(host: str) -> URL:
+    """URL реплики: host или host:port, остальное как у основной БД"""
+    host, _, port = host.partition(":")
+    return url.set(host=host, port=int(port) if port else config.postgres_port)
+
+
+replica_set.configure(
+    [instrument_engine(create_async_engine(replica_url(host), echo=False, **engine_options(config)), f"replica {host}")
+     for host in config.replica_hosts],
+    retry_seconds=config.replica_retry_seconds,
+    read_your_writes_seconds=config.read_your_writes_seconds
 )
-new_session = async_sessionmaker(async_engine, expire_on_commit=False)
+new_session = async_sessionmaker(
+    async_engine, expire_on_commit=False, sync_session_class=RoutingSession)
+
+
+def get_pool_stats() -> dict:
+    """Возвращает состояние пулов соединений с БД для мониторинга: {имя engine: метрики}"""
+    stats = {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+    for name, metrics in pool_metrics.items():
+        if metrics.engine in replica_set.engines:
+            stats[name]["available"] = replica_set.is_available(metrics.engine.sync_engine)
+    return stats
 
 
 async def create_tables():
@@ -42,7 +93,9 @@ async def pre_create_actions(conn: AsyncConnection):
 
 
 async def after_create_actions(conn: AsyncConnection):
-    ...
+    from app.database.partitions import ensure_partitions
+    # NOTE: create_all создает секционированные таблицы без секций, без них вставка в таблицу невозможна
+    await ensure_partitions(conn, config.partitions_ahead)
     # DEPRECATED:
     # commands = [
     #     "DROP TRIGGER IF EXISTS insert_empty_user_info ON auth.user_credentials;",
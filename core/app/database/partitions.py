@@ -0,0 +1,275 @@
+"""
+Помесячное секционирование больших таблиц, в которые записи в основном только добавляются и которые читаются
+по диапазону date_time: statistics, addresses, calls. Секция месяца покрывает [начало месяца, начало следующего)
+в unix времени по UTC, строки вне созданных секций попадают в секцию DEFAULT. Секции наперед создает
+не сервис при старте, а миграция partitions, которую запускают по расписанию (например, раз в месяц из cron). Запросы по диапазону date_time
+читают только нужные секции, а старые месяцы отсоединяются целой секцией (DETACH) вместо массового DELETE.
+Первичный ключ секционированных таблиц - (id, date_time), уникальность одного id БД не проверяет (см. StatisticOrm).
+"""
+import logging
+import re
+from datetime import datetime, timezone
+from sqlalchemy import Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database.models import StatisticOrm, StatisticDailyOrm, AddressOrm, CallOrm
+
+
+PARTITIONED_TABLES: list[Table] = [StatisticOrm.__table__, AddressOrm.__table__, CallOrm.__table__]
+PARTITIONS_AHEAD_DEFAULT = 3
+BOUNDS_PATTERN = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+# NOTE: плановый запуск миграции partitions может совпасть с ручным detach/attach, поэтому DDL идет под одной блокировкой
+PARTITIONS_LOCK_KEY = "app.database.partitions"
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def parse_month(month: str) -> datetime:
+    """Месяц в виде YYYY-MM"""
+    return datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+
+
+def partition_bounds(month: datetime) -> tuple[int, int]:
+    """Границы секции месяца в unix времени: начало включительно, конец не включительно"""
+    return int(month.timestamp()), int(add_months(month, 1).timestamp())
+
+
+def partition_name(table: Table, month: datetime) -> str:
+    return f"{table.name}_{month:%Y_%m}"
+
+
+def default_partition_name(table: Table) -> str:
+    return f"{table.name}_default"
+
+
+def qualified(table: Table, name: str | None = None) -> str:
+    return f'"{table.schema}"."{name or table.name}"'
+
+
+async def lock_partitions(connection: AsyncConnection):
+    """Блокировка до конца транзакции, под которой меняется набор секций"""
+    await connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": PARTITIONS_LOCK_KEY})
+
+
+async def is_partitioned(connection: AsyncConnection, table: Table) -> bool:
+    result = await connection.execute(text(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :name
+        )
+        """
+    ), {"schema": table.schema, "name": table.name})
+    return result.scalar()
+
+
+async def get_partitions(connection: AsyncConnection, table: Table) -> dict[str, tuple[int, int] | None]:
+    """Присоединенные секции таблицы: {имя: (начало, конец)}; у DEFAULT секции границ нет (None)"""
+    result = await connection.execute(text(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = :schema AND p.relname = :name
+        """
+    ), {"schema": table.schema, "name": table.name})
+    partitions = {}
+    for name, bounds in result.all():
+        match = BOUNDS_PATTERN.search(bounds)
+        partitions[name] = (int(match[1]), int(match[2])) if match else None
+    return partitions
+
+
+async def attach_month_partition(connection: AsyncConnection, table: Table, month: datetime):
+    """
+    Присоединяет готовую таблицу partition_name(table, month) секцией месяца. Строки этого месяца,
+    которые уже попали в DEFAULT секцию, переносятся в нее: иначе PostgreSQL не даст присоединить секцию.
+    """
+    start, end = partition_bounds(month)
+    name = partition_name(table, month)
+    constraint = f'"{name}_bounds"'
+    # NOTE: с проверенным CHECK на границы ATTACH не сканирует секцию под блокировкой всей таблицы
+    await connection.execute(text(
+        f"ALTER TABLE {qualified(table, name)} ADD CONSTRAINT {constraint} "
+        f"CHECK (date_time IS NOT NULL AND date_time >= {start} AND date_time < {end})"
+    ))
+    if default_partition_name(table) in await get_partitions(connection, table):
+        await connection.execute(text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {qualified(table, default_partition_name(table))}
+                WHERE date_time >= {start} AND date_time < {end}
+                RETURNING *
+            )
+            INSERT INTO {qualified(table, name)} SELECT * FROM moved
+            """
+        ))
+    await connection.execute(text(
+        f"ALTER TABLE {qualified(table)} ATTACH PARTITION {qualified(table, name)} FOR VALUES FROM ({start}) TO ({end})"
+    ))
+    await connection.execute(text(f"ALTER TABLE {qualified(table, name)} DROP CONSTRAINT {constraint}"))
+
+
+async def create_month_partition(connection: AsyncConnection, table: Table, month: datetime):
+    """Создает секцию месяца"""
+    name = partition_name(table, month)
+    await connection.execute(text(
+        f"CREATE TABLE {qualified(table, name)} (LIKE {qualified(table)} INCLUDING DEFAULTS)"
+    ))
+    await attach_month_partition(connection, table, month)
+    logging.info(f"Создана секция {table.schema}.{name}")
+
+
+async def create_default_partition(connection: AsyncConnection, table: Table):
+    await connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {qualified(table, default_partition_name(table))} PARTITION OF {qualified(table)} DEFAULT"
+    ))
+
+
+def upcoming_months(months_ahead: int) -> set[datetime]:
+    """Текущий месяц и months_ahead следующих"""
+    current = month_start(datetime.now(timezone.utc))
+    return {add_months(current, i) for i in range(months_ahead + 1)}
+
+
+async def ensure_table_partitions(connection: AsyncConnection, table: Table, months: set[datetime]):
+    """Создает DEFAULT секцию и секции месяцев months, которых еще нет"""
+    await create_default_partition(connection, table)
+    partitions = await get_partitions(connection, table)
+    for month in sorted(months):
+        if partition_name(table, month) not in partitions:
+            await create_month_partition(connection, table, month)
+
+
+async def ensure_partitions(connection: AsyncConnection, months_ahead: int = PARTITIONS_AHEAD_DEFAULT):
+    """Создает секции текущего месяца и months_ahead следующих во всех секционированных таблицах"""
+    await lock_partitions(connection)
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(connection, table):
+            logging.warning(f"Таблица {table.fullname} не секционирована: python -m app.database.migrations partition")
+            continue
+        await ensure_table_partitions(connection, table, upcoming_months(months_ahead))
+
+
+async def default_partition_rows(connection: AsyncConnection, table: Table) -> dict[str | None, int]:
+    """Строки DEFAULT секции по месяцам: {YYYY-MM: число строк}"""
+    if default_partition_name(table) not in await get_partitions(connection, table):
+        return {}
+    result = await connection.execute(text(
+        f"""
+        SELECT to_char(to_timestamp(date_time) AT TIME ZONE 'UTC', 'YYYY-MM'), count(*)
+        FROM {qualified(table, default_partition_name(table))}
+        GROUP BY 1 ORDER BY 1
+        """
+    ))
+    return dict(result.all())
+
+
+async def rebuild_daily_rollup(connection: AsyncConnection, start: int, end: int):
+    """
+    Пересчитывает суточные суммы statistics_daily за [start, end) по строкам statistics этого диапазона,
+    которые сейчас есть в таблице (например, попавшим в DEFAULT секцию до создания секции месяца)
+    """
+    await connection.execute(text(
+        f"DELETE FROM {qualified(StatisticDailyOrm.__table__)} WHERE day >= {start} AND day < {end}"
+    ))
+    await connection.execute(text(
+        f"""
+        INSERT INTO {qualified(StatisticDailyOrm.__table__)} (user_id, day, work_type, count)
+        SELECT user_id, date_time - date_time % 86400, work_type, sum(count)
+        FROM {qualified(StatisticOrm.__table__)}
+        WHERE date_time >= {start} AND date_time < {end}
+        GROUP BY user_id, date_time - date_time % 86400, work_type
+        """
+    ))
+
+
+async def detach_partitions_before(connection: AsyncConnection, month: datetime, drop: bool = False) -> list[str]:
+    """
+    Отсоединяет (и при drop удаляет) секции месяцев раньше month. Отсоединенная секция остается обычной таблицей
+    с тем же именем, ее можно вернуть через reattach_month_partition. Суточные суммы statistics_daily
+    за эти месяцы пересчитываются по строкам, оставшимся в statistics, чтобы статистика за период считалась
+    только по присоединенным секциям.
+    """
+    await lock_partitions(connection)
+    before = int(month.timestamp())
+    detached = []
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(connection, table):
+            continue
+        for name, bounds in sorted((await get_partitions(connection, table)).items()):
+            if bounds is None or bounds[1] > before:
+                continue
+            await connection.execute(text(f"ALTER TABLE {qualified(table)} DETACH PARTITION {qualified(table, name)}"))
+            if table is StatisticOrm.__table__:
+                await rebuild_daily_rollup(connection, *bounds)
+            if drop:
+                await connection.execute(text(f"DROP TABLE {qualified(table, name)}"))
+            logging.info(f"Секция {table.schema}.{name} {'удалена' if drop else 'отсоединена'}")
+            detached.append(name)
+    return detached
+
+
+async def reattach_month_partition(connection: AsyncConnection, table: Table, month: datetime):
+    """Возвращает отсоединенную секцию месяца; для statistics суточные суммы восстанавливаются по ее строкам"""
+    await lock_partitions(connection)
+    name = partition_name(table, month)
+    if table is StatisticOrm.__table__:
+        # NOTE: строки, попавшие в DEFAULT за это время, в statistics_daily уже учтены, добавляются только строки секции
+        await connection.execute(text(
+            f"""
+            INSERT INTO {qualified(StatisticDailyOrm.__table__)} (user_id, day, work_type, count)
+            SELECT user_id, date_time - date_time % 86400, work_type, sum(count)
+            FROM {qualified(table, name)}
+            GROUP BY user_id, date_time - date_time % 86400, work_type
+            ON CONFLICT (user_id, day, work_type) DO UPDATE SET count = statistics_daily.count + excluded.count
+            """
+        ))
+    await attach_month_partition(connection, table, month)
+    logging.info(f"Секция {table.schema}.{name} присоединена")
+
+
+async def partition_table(connection: AsyncConnection, table: Table, months_ahead: int = PARTITIONS_AHEAD_DEFAULT) -> bool:
+    """
+    Переводит обычную таблицу в секционированную: старая переименовывается, создается секционированная с секциями
+    всех месяцев, в которых есть строки, строки переносятся, старая удаляется. Все в одной транзакции,
+    таблица на это время заблокирована. Возвращает False, если таблица уже секционирована.
+    """
+    await lock_partitions(connection)
+    if await is_partitioned(connection, table):
+        return False
+    old_name = f"{table.name}_unpartitioned"
+    await connection.execute(text(f"LOCK TABLE {qualified(table)} IN ACCESS EXCLUSIVE MODE"))
+    await connection.execute(text(f'ALTER TABLE {qualified(table)} RENAME TO "{old_name}"'))
+    # NOTE: имена индексов уникальны в схеме, а секционированная таблица создает индексы с теми же именами
+    result = await connection.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :name"
+    ), {"schema": table.schema, "name": old_name})
+    for index_name in result.scalars().all():
+        await connection.execute(text(
+            f'ALTER INDEX {qualified(table, index_name)} RENAME TO "{index_name}_unpartitioned"'
+        ))
+    # NOTE: checkfirst, чтобы не создавать заново типы enum, которые уже есть у старой таблицы
+    await connection.run_sync(table.create, checkfirst=True)
+    result = await connection.execute(text(
+        f"SELECT DISTINCT date_trunc('month', to_timestamp(date_time) AT TIME ZONE 'UTC') FROM {qualified(table, old_name)}"
+    ))
+    months = [month.replace(tzinfo=timezone.utc) for month in result.scalars().all()]
+    await ensure_table_partitions(connection, table, upcoming_months(months_ahead) | set(months))
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    await connection.execute(text(
+        f"INSERT INTO {qualified(table)} ({columns}) SELECT {columns} FROM {qualified(table, old_name)}"
+    ))
+    await connection.execute(text(f"DROP TABLE {qualified(table, old_name)}"))
+    logging.info(f"Таблица {table.fullname} секционирована по месяцам: {len(months)} месяцев с данными")
+    return True
@@ -0,0 +1,96 @@
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+
+class PoolMetrics:
+    """Счетчики пула соединений одного engine для мониторинга"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.checked_out = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_seconds = 0.0
+        self.wait_max_seconds = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_total_seconds += seconds
+        self.wait_max_seconds = max(self.wait_max_seconds, seconds)
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checked_out += 1
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        self.checked_out -= 1
+
+    def snapshot(self) -> dict:
+        # NOTE: после dispose у engine новый пул, счетчики при этом продолжаются
+        pool = self.engine.sync_engine.pool
+        stats = {
+            "pool_class": type(pool).__name__,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(1000 * self.wait_total_seconds / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(1000 * self.wait_max_seconds, 3)
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout()
+            })
+        return stats
+
+
+# NOTE: метрики по имени engine: основная БД и каждая реплика считаются отдельно
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+class InstrumentedPoolMixin:
+    """Замеряет время ожидания соединения из пула и считает таймауты"""
+
+    metrics: PoolMetrics | None = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(InstrumentedPoolMixin, NullPool):
+    pass
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> AsyncEngine:
+    """Подключает счетчики к пулу engine под именем name"""
+    metrics = PoolMetrics(engine)
+    pool = engine.sync_engine.pool
+    pool.metrics = metrics
+    # NOTE: слушатели пула, а не класса Pool: иначе соединения всех engine попадали бы в одни счетчики;
+    # при dispose новый пул получает слушатели старого
+    event.listen(pool, "checkout", metrics.on_checkout)
+    event.listen(pool, "checkin", metrics.on_checkin)
+    pool_metrics[name] = metrics
+    return engine
@@ -0,0 +1,150 @@
+import functools
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+
+class ReplicaSet:
+    """
+    Реплики для чтения: выбираются по кругу; реплика, на которой была ошибка соединения,
+    пропускается retry_seconds секунд, после чего снова пробуется.
+    """
+
+    def __init__(self):
+        self.engines: list[AsyncEngine] = []
+        self.retry_seconds = 30
+        self.read_your_writes_seconds = 5
+        self.__down_until: dict[Engine, float] = {}
+        self.__next = itertools.count()
+        self.__recent_writers: dict[str, float] = {}
+
+    def configure(self, engines: list[AsyncEngine], retry_seconds: int, read_your_writes_seconds: int):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        for engine in engines:
+            event.listen(engine.sync_engine, "handle_error", self.__on_error)
+
+    def is_available(self, engine: Engine) -> bool:
+        return self.__down_until.get(engine, 0) <= time.monotonic()
+
+    def choose(self) -> Engine | None:
+        """Следующая живая реплика или None, если реплик нет или все недоступны"""
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self.__next) % len(self.engines)].sync_engine
+            if self.is_available(engine):
+                return engine
+        return None
+
+    def mark_down(self, engine: Engine):
+        logging.warning(f"Реплика {engine.url.host} недоступна, чтение идет с основной БД")
+        self.__down_until[engine] = time.monotonic() + self.retry_seconds
+
+    def __on_error(self, context):
+        if context.is_disconnect or isinstance(context.original_exception, (OSError, ConnectionError)):
+            self.mark_down(context.engine)
+            routing = read_routing.get()
+            if routing is not None:
+                routing.replica_failed = True
+
+    def note_write(self, user_id: str):
+        """Запоминает запись пользователя: его чтения идут с основной БД, пока реплики могут отставать"""
+        self.__recent_writers[user_id] = time.monotonic() + self.read_your_writes_seconds
+
+    def wrote_recently(self, user_id: str) -> bool:
+        until = self.__recent_writers.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            self.__recent_writers.pop(user_id, None)
+            return False
+        return True
+
+
+replica_set = ReplicaSet()
+
+
+class ReadRouting:
+    """Состояние маршрутизации одного вызова read_only метода"""
+
+    def __init__(self, use_primary: bool = False):
+        self.use_primary = use_primary
+        self.replica: Engine | None = None
+        self.replica_failed = False
+
+
+read_routing: ContextVar[ReadRouting | None] = ContextVar("read_routing", default=None)
+primary_override: ContextVar[bool] = ContextVar("primary_override", default=False)
+
+
+def read_only(method):
+    """
+    Помечает метод репозитория как только читающий: его SELECT уходят на реплику.
+    Если реплика оказалась недоступна, метод выполняется повторно на основной БД.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        if not replica_set.engines or read_routing.get() is not None:
+            return await method(*args, **kwargs)
+        routing = ReadRouting(use_primary=primary_override.get())
+        token = read_routing.set(routing)
+        try:
+            try:
+                result = await method(*args, **kwargs)
+            except OSError:
+                # NOTE: asyncpg отдает ошибку установки соединения как есть, без обертки SQLAlchemy
+                if routing.replica is None:
+                    raise
+                replica_set.mark_down(routing.replica)
+                routing.replica_failed = True
+            if routing.replica_failed:
+                routing.use_primary = True
+                result = await method(*args, **kwargs)
+            return result
+        finally:
+            read_routing.reset(token)
+    return wrapper
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Внутри блока все чтения идут с основной БД (read-your-writes)"""
+    token = primary_override.set(True)
+    try:
+        yield
+    finally:
+        primary_override.reset(token)
+
+
+class RoutingSession(Session):
+    """
+    Выбирает соединение для каждого запроса: SELECT внутри read_only методов - реплика,
+    все остальное (и чтения после записи в этой же сессии или недавней записи пользователя) - основная БД.
+    """
+
+    user_id: str | None = None
+    wrote = False
+    replica: Engine | None = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        routing = read_routing.get()
+        if getattr(clause, "is_dml", False) or self._flushing:
+            self.wrote = True
+            if self.user_id:
+                replica_set.note_write(self.user_id)
+        elif getattr(clause, "is_select", False) and routing is not None and not routing.use_primary and not self.wrote \
+                and not (self.user_id and replica_set.wrote_recently(self.user_id)):
+            # NOTE: сессия держится одной реплики, чтобы не занимать соединения сразу на нескольких
+            if self.replica is None or not replica_set.is_available(self.replica):
+                self.replica = replica_set.choose()
+            if self.replica is not None:
+                routing.replica = self.replica
+                return self.replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
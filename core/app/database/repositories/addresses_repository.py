@@ -1,13 +1,17 @@
-from sqlalchemy import select, delete
+from sqlalchemy import func, select, delete, lambda_stmt
+from sqlalchemy.sql import Select, StatementLambdaElement
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
 from app.database.models import AddressOrm
 from .base_repository import BaseRepository
+from app.database.replicas import read_only
+from app.utils.pagination import keyset_page, split_page
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, AsyncIterator
 
 if TYPE_CHECKING:
-    from app.api.models import Address
+    from app.api.models import Address, AddressesSummary
 
 
 class AddressesRepository(BaseRepository):
@@ -32,18 +36,108 @@ class AddressesRepository(BaseRepository):
             logging.error(e.__str__())
             return None
 
-    async def get_address_info_by_user_id(self, user_id: str, date_start: int | None = None, date_end: int | None = None) -> list[AddressOrm]:
-        """Возвращает адреса, связанные с пользователем, с возможностью фильтрации по дате."""
+    def stream_user_addresses(self, user_id: str, date_start: int | None = None, date_end: int | None = None) -> AsyncIterator[AddressOrm]:
+        """Отдает все адреса пользователя (с фильтром по дате) от старых к новым, не загружая их в память целиком."""
+        query = select(AddressOrm).where(AddressOrm.user_id == user_id)
+        if date_start is not None:
+            query = query.where(AddressOrm.date_time >= date_start)
+        if date_end is not None:
+            query = query.where(AddressOrm.date_time <= date_end)
+        return self.stream_scalars(query.order_by(AddressOrm.date_time, AddressOrm.id))
+
+    @staticmethod
+    def addresses_page_query(user_id: str, limit: int | None, after: tuple[int, str] | None = None, date_start: int | None = None, date_end: int | None = None, fields: list[str] | None = None) -> StatementLambdaElement:
+        """Запрос страницы адресов пользователя от новых к старым (keyset по date_time, id) с фильтром по дате"""
+        query = BaseRepository.select_fields(AddressOrm, fields)
+        query += lambda s: s.where(AddressOrm.user_id == user_id)
+        if date_start is not None:
+            query += lambda s: s.where(AddressOrm.date_time >= date_start)
+        if date_end is not None:
+            query += lambda s: s.where(AddressOrm.date_time <= date_end)
+        return keyset_page(query, AddressOrm.date_time, AddressOrm.id, limit, after)
+
+    @read_only
+    async def get_user_addresses_page(self, user_id: str, limit: int | None, after: tuple[int, str] | None = None, date_start: int | None = None, date_end: int | None = None, fields: list[str] | None = None) -> tuple[list, tuple[int, str] | None] | None:
+        """Возвращает страницу адресов пользователя от новых к старым (с фильтром по дате) и ключ следующей страницы; fields - выбрать только эти колонки."""
+        try:
+            async with self.session:
+                query = self.addresses_page_query(user_id, limit, after, date_start, date_end, fields)
+                result = await self.session.execute(query)
+                return split_page(self.fetch_rows(result, fields), limit, "date_time")
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def last_addresses_query(user_ids: list[str], limit: int, date_start: int | None = None, date_end: int | None = None) -> Select:
+        """Запрос не более limit последних адресов каждого из пользователей user_ids"""
+        ranked = select(
+            AddressOrm,
+            func.row_number().over(
+                partition_by=AddressOrm.user_id,
+                order_by=(AddressOrm.date_time.desc(), AddressOrm.id.desc())
+            ).label('row_number')
+        ).where(AddressOrm.user_id.in_(set(user_ids)))
+        if date_start is not None:
+            ranked = ranked.where(AddressOrm.date_time >= date_start)
+        if date_end is not None:
+            ranked = ranked.where(AddressOrm.date_time <= date_end)
+        ranked = ranked.subquery()
+        last_addresses = aliased(AddressOrm, ranked)
+        return (
+            select(last_addresses)
+            .where(ranked.c.row_number <= limit)
+            .order_by(ranked.c.user_id, ranked.c.row_number)
+        )
+
+    @read_only
+    async def get_last_addresses_by_user_ids(self, user_ids: list[str], limit: int, date_start: int | None = None, date_end: int | None = None) -> dict[str, list[AddressOrm]] | None:
+        """Возвращает не более limit последних адресов каждого пользователя одним запросом: {user_id: [AddressOrm]}."""
+        try:
+            async with self.session:
+                query = self.last_addresses_query(user_ids, limit, date_start, date_end)
+                result = await self.session.execute(query)
+                addresses = {user_id: [] for user_id in user_ids}
+                for address in result.scalars().all():
+                    addresses[address.user_id].append(address)
+                return addresses
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def addresses_summary_query(user_ids: list[str], date_start: int | None = None, date_end: int | None = None) -> StatementLambdaElement:
+        """Запрос (последний адрес, количество адресов) для каждого из пользователей user_ids"""
+        # NOTE: DISTINCT ON оставляет по одной (последней) строке на пользователя, count() OVER считает до DISTINCT
+        ids = list(set(user_ids))
+        query = lambda_stmt(lambda: (
+            select(
+                AddressOrm,
+                func.count().over(partition_by=AddressOrm.user_id)
+            )
+            .where(AddressOrm.user_id.in_(ids))
+            .distinct(AddressOrm.user_id)
+            .order_by(AddressOrm.user_id, AddressOrm.date_time.desc(), AddressOrm.id.desc())
+        ))
+        if date_start is not None:
+            query += lambda s: s.where(AddressOrm.date_time >= date_start)
+        if date_end is not None:
+            query += lambda s: s.where(AddressOrm.date_time <= date_end)
+        return query
+
+    @read_only
+    async def get_addresses_summary_by_user_ids(self, user_ids: list[str], date_start: int | None = None, date_end: int | None = None) -> dict[str, 'AddressesSummary'] | None:
+        """Возвращает сводку по адресам пользователей одним запросом: количество и последнее местоположение."""
+        from app.api.models import Address, AddressesSummary
         try:
             async with self.session:
-                query = select(AddressOrm).where(AddressOrm.user_id == user_id)
-                if date_start is not None:
-                    query = query.where(AddressOrm.date_time >= date_start)
-                if date_end is not None:
-                    query = query.where(AddressOrm.date_time <= date_end)
+                query = self.addresses_summary_query(user_ids, date_start, date_end)
                 result = await self.session.execute(query)
-                addresses = result.scalars().all()
-                return list(addresses)
+                summaries = {user_id: AddressesSummary() for user_id in user_ids}
+                for address, count in result.all():
+                    summaries[address.user_id] = AddressesSummary(
+                        count=count, last_address=Address.model_validate(address))
+                return summaries
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
@@ -1,21 +1,46 @@
 from ..orm import new_session
+from ..session_scope import current_session_scope
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import VersionOrm
-from sqlalchemy.sql import text, select
+from sqlalchemy.sql import text, select, lambda_stmt, Select, StatementLambdaElement
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Any, AsyncIterator
 import logging
 
 
+STREAM_BATCH_SIZE = 1000
+
+
 class BaseRepository:
     """Класс репозиторий для работы с базой данных как с объектом"""
 
     def __init__(self):
-        self.session = new_session()
+        self.__session: AsyncSession | None = None
+
+    @property
+    def session(self) -> AsyncSession:
+        """Сессия запроса, общая для всех репозиториев, а вне запроса - своя; создается при первом обращении"""
+        scope = current_session_scope.get()
+        if scope is not None:
+            return scope.session
+        if self.__session is None:
+            self.__session = new_session()
+        return self.__session
 
     async def dispose(self):
-        """Закрывает сессию"""
-        await self.session.close()
+        """Закрывает сессию (возвращает соединение в пул)"""
+        scope = current_session_scope.get()
+        if scope is not None:
+            # NOTE: сессия области остается общей, а соединение освобождает выход из внешнего блока
+            await scope.exit_block()
+        elif self.__session is not None:
+            await self.__session.close()
 
     async def __aenter__(self):
         logging.debug("Сессия открыта")
+        scope = current_session_scope.get()
+        if scope is not None:
+            scope.enter_block()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -26,6 +51,36 @@ class BaseRepository:
     def repository_factory():
         return BaseRepository()
 
+    @staticmethod
+    def select_fields(orm: type, fields: list[str] | None = None) -> StatementLambdaElement:
+        """
+        SELECT всей сущности или только колонок fields (тогда результат - строки, а не ORM объекты).
+        Возвращает lambda statement: условия добавляются через query += lambda s: s.where(...),
+        а скомпилированный SQL кешируется по набору колонок.
+        """
+        if fields is None:
+            return lambda_stmt(lambda: select(orm))
+        columns = [getattr(orm, field) for field in fields]
+        return lambda_stmt(lambda: select(*columns), track_on=[tuple(columns)])
+
+    @staticmethod
+    def fetch_rows(result, fields: list[str] | None = None) -> list:
+        """ORM объекты для select_fields без fields, иначе строки с запрошенными колонками"""
+        return list(result.scalars().all()) if fields is None else list(result.all())
+
+    async def stream_scalars(self, query: Select, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[Any]:
+        """Отдает результат запроса по одному объекту, читая его серверным курсором пачками по batch_size строк"""
+        try:
+            # NOTE: своя сессия - поток читается уже после завершения обработчика и держит соединение до конца выгрузки
+            async with new_session() as session:
+                result = await session.stream_scalars(
+                    query.execution_options(yield_per=batch_size))
+                async for item in result:
+                    yield item
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            raise
+
     # -------------------------- config --------------------------
 
     @classmethod
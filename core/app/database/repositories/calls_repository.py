@@ -1,13 +1,19 @@
-from sqlalchemy import select, update
+import uuid
+from sqlalchemy import func, select, update, insert, literal, lambda_stmt
+from sqlalchemy.sql import Select, StatementLambdaElement
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
 from app.database.models import CallOrm, FileOrm
 from .base_repository import BaseRepository
+from app.database.replicas import read_only
+from .files_repository import FilesRepository
+from app.utils.pagination import keyset_page, split_page
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, AsyncIterator
 
 if TYPE_CHECKING:
-    from app.api.models import Call
+    from app.api.models import Call, CallsSummary
 
 
 class CallsRepository(BaseRepository):
@@ -33,13 +39,132 @@ class CallsRepository(BaseRepository):
             logging.error(e.__str__())
             return None
 
-    async def get_all_info_user_calls(self, user_id: str) -> list[CallOrm] | None:
-        """Возвращает информацию о всех звонках пользователя."""
+    async def add_call_record_with_file(self, call: 'Call', obj_name: str, bucket_name: str) -> tuple[str, str] | None:
+        """Добавляет запись звонка вместе с файлом аудиозаписи и доступом владельца одним запросом; возвращает (Id звонка, Id файла)."""
         try:
             async with self.session:
-                query = select(CallOrm).where(CallOrm.user_id == user_id)
+                registration = FilesRepository.file_registration(
+                    obj_name, bucket_name, call.user_id)
+                values = call.model_dump(exclude={"id", "file_id"})
+                columns = list(values)
+                new_call = (
+                    insert(CallOrm)
+                    .from_select(
+                        [CallOrm.id, *[getattr(CallOrm, c) for c in columns], CallOrm.file_id],
+                        select(
+                            literal(str(uuid.uuid4())),
+                            *[literal(values[c], getattr(CallOrm, c).type) for c in columns],
+                            registration.c.file_id
+                        )
+                    )
+                    .returning(CallOrm.id, CallOrm.file_id)
+                )
+                result = await self.session.execute(new_call)
+                call_id, file_id = result.one()
+                await self.session.commit()
+                return call_id, file_id
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    def stream_user_calls(self, user_id: str) -> AsyncIterator[CallOrm]:
+        """Отдает все звонки пользователя от старых к новым, не загружая их в память целиком."""
+        query = (
+            select(CallOrm)
+            .where(CallOrm.user_id == user_id)
+            .order_by(CallOrm.date_time, CallOrm.id)
+        )
+        return self.stream_scalars(query)
+
+    @staticmethod
+    def calls_page_query(user_id: str, limit: int | None, after: tuple[int, str] | None = None, fields: list[str] | None = None) -> StatementLambdaElement:
+        """Запрос страницы звонков пользователя от новых к старым (keyset по date_time, id)"""
+        query = BaseRepository.select_fields(CallOrm, fields)
+        query += lambda s: s.where(CallOrm.user_id == user_id)
+        return keyset_page(query, CallOrm.date_time, CallOrm.id, limit, after)
+
+    @read_only
+    async def get_user_calls_page(self, user_id: str, limit: int | None, after: tuple[int, str] | None = None, fields: list[str] | None = None) -> tuple[list, tuple[int, str] | None] | None:
+        """Возвращает страницу звонков пользователя от новых к старым и ключ следующей страницы; fields - выбрать только эти колонки."""
+        try:
+            async with self.session:
+                query = self.calls_page_query(user_id, limit, after, fields)
+                result = await self.session.execute(query)
+                return split_page(self.fetch_rows(result, fields), limit, "date_time")
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def last_calls_query(user_ids: list[str], limit: int, date_start: int | None = None, date_end: int | None = None) -> Select:
+        """Запрос не более limit последних звонков каждого из пользователей user_ids"""
+        ranked = select(
+            CallOrm,
+            func.row_number().over(
+                partition_by=CallOrm.user_id,
+                order_by=(CallOrm.date_time.desc(), CallOrm.id.desc())
+            ).label('row_number')
+        ).where(CallOrm.user_id.in_(set(user_ids)))
+        if date_start is not None:
+            ranked = ranked.where(CallOrm.date_time >= date_start)
+        if date_end is not None:
+            ranked = ranked.where(CallOrm.date_time <= date_end)
+        ranked = ranked.subquery()
+        last_calls = aliased(CallOrm, ranked)
+        return (
+            select(last_calls)
+            .where(ranked.c.row_number <= limit)
+            .order_by(ranked.c.user_id, ranked.c.row_number)
+        )
+
+    @read_only
+    async def get_last_calls_by_user_ids(self, user_ids: list[str], limit: int, date_start: int | None = None, date_end: int | None = None) -> dict[str, list[CallOrm]] | None:
+        """Возвращает не более limit последних звонков каждого пользователя одним запросом: {user_id: [CallOrm]}."""
+        try:
+            async with self.session:
+                query = self.last_calls_query(user_ids, limit, date_start, date_end)
+                result = await self.session.execute(query)
+                calls = {user_id: [] for user_id in user_ids}
+                for call in result.scalars().all():
+                    calls[call.user_id].append(call)
+                return calls
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def calls_summary_query(user_ids: list[str], date_start: int | None = None, date_end: int | None = None) -> StatementLambdaElement:
+        """Запрос (user_id, количество, суммарная длительность, время последнего звонка) пользователей user_ids"""
+        ids = list(set(user_ids))
+        query = lambda_stmt(lambda: (
+            select(
+                CallOrm.user_id,
+                func.count(CallOrm.id),
+                func.coalesce(func.sum(CallOrm.length_seconds), 0),
+                func.max(CallOrm.date_time)
+            )
+            .where(CallOrm.user_id.in_(ids))
+            .group_by(CallOrm.user_id)
+        ))
+        if date_start is not None:
+            query += lambda s: s.where(CallOrm.date_time >= date_start)
+        if date_end is not None:
+            query += lambda s: s.where(CallOrm.date_time <= date_end)
+        return query
+
+    @read_only
+    async def get_calls_summary_by_user_ids(self, user_ids: list[str], date_start: int | None = None, date_end: int | None = None) -> dict[str, 'CallsSummary'] | None:
+        """Возвращает сводку по звонкам пользователей одним запросом: количество, суммарная длительность, время последнего звонка."""
+        from app.api.models import CallsSummary
+        try:
+            async with self.session:
+                query = self.calls_summary_query(user_ids, date_start, date_end)
                 result = await self.session.execute(query)
-                return list(result.scalars().all())
+                summaries = {user_id: CallsSummary() for user_id in user_ids}
+                for user_id, count, total_length_seconds, last_call_at in result.all():
+                    summaries[user_id] = CallsSummary(
+                        count=count, total_length_seconds=total_length_seconds, last_call_at=last_call_at)
+                return summaries
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
@@ -1,8 +1,12 @@
 from enum import Enum
+import uuid
 from sqlalchemy.sql import text
+from sqlalchemy.sql.selectable import CTE
+from sqlalchemy.sql import Select
 from app.database.models import FileOrm, FilesAccessOrm, FileAccessModeOrm
-from sqlalchemy import select, update, delete, insert, and_
+from sqlalchemy import select, update, delete, insert, and_, exists, literal
 from .base_repository import BaseRepository
+from app.utils.access_cache import AccessCache
 import logging
 from typing import TYPE_CHECKING
 
@@ -10,6 +14,9 @@ if TYPE_CHECKING:
     from app.api.models import File, FileAccessMode, FilesAccess
 
 
+access_cache = AccessCache.factory()
+
+
 class FilesRepository(BaseRepository):
     """
     Класс репозиторий для работы с базой данных как с объектом
@@ -19,21 +26,46 @@ class FilesRepository(BaseRepository):
     def repository_factory():
         return FilesRepository()
 
+    @staticmethod
+    def file_registration(obj_name: str, bucket_name: str, user_id: str) -> CTE:
+        """
+        CTE, который одним запросом вставляет файл (INSERT ... RETURNING) и запись доступа WRITE для владельца.
+        Колонка file_id результата - Id нового файла; к CTE можно присоединить вставку связанной записи (например, звонка).
+        """
+        new_file = (
+            insert(FileOrm)
+            .values(id=str(uuid.uuid4()), obj_name=obj_name, bucket_name=bucket_name)
+            .returning(FileOrm.id)
+            .cte("new_file")
+        )
+        return (
+            insert(FilesAccessOrm)
+            .from_select(
+                [FilesAccessOrm.id, FilesAccessOrm.user_id,
+                    FilesAccessOrm.file_id, FilesAccessOrm.file_access_mode],
+                select(
+                    literal(str(uuid.uuid4())),
+                    literal(user_id),
+                    new_file.c.id,
+                    literal(FileAccessModeOrm.WRITE,
+                            FilesAccessOrm.file_access_mode.type)
+                )
+            )
+            .returning(FilesAccessOrm.file_id)
+            .cte("owner_access")
+        )
+
     async def add_file(self, obj_name: str, bucket_name: str, user_id: str, file_id: str = None) -> str:
         """Добавляет файл в базу данных и связывает его с пользователем."""
         try:
             if not file_id:
                 async with self.session:
-                    new_file = FileOrm(
-                        obj_name=obj_name,
-                        bucket_name=bucket_name
-                    )
-                    self.session.add(new_file)
+                    # NOTE: файл и доступ владельца - один запрос в одной транзакции, без файла без владельца
+                    registration = self.file_registration(
+                        obj_name, bucket_name, user_id)
+                    new_file_id = await self.session.scalar(select(registration.c.file_id))
                     await self.session.commit()
-
-                    await self.add_access_to(user_id, new_file.id)
-
-                    return new_file.id
+                    return new_file_id
             else:
                 async with self.session:
                     old_file = await self.session.get(FileOrm, file_id)
@@ -44,6 +76,12 @@ class FilesRepository(BaseRepository):
                             bucket_name=bucket_name
                         )
                         self.session.add(old_file)
+                        self.session.add(FilesAccessOrm(
+                            user_id=user_id,
+                            file_id=file_id,
+                            file_access_mode=FileAccessModeOrm.WRITE
+                        ))
+                        access_cache.invalidate(user_id, file_id)
                     else:
                         old_file.obj_name = obj_name
                         old_file.bucket_name = bucket_name
@@ -54,18 +92,27 @@ class FilesRepository(BaseRepository):
             logging.error(e.__str__())
             return None
 
+    @staticmethod
+    def access_check_query(access: Enum, user_id: str, file_id: str) -> Select:
+        """Запрос EXISTS записи доступа: для READ подходит любая, для WRITE нужна запись с WRITE"""
+        # NOTE: EXISTS по индексу (file_id, user_id) с INCLUDE file_access_mode - index only scan
+        condition = and_(FilesAccessOrm.file_id == file_id,
+                         FilesAccessOrm.user_id == user_id)
+        if access.name == FileAccessModeOrm.WRITE.name:
+            condition = and_(
+                condition, FilesAccessOrm.file_access_mode == FileAccessModeOrm.WRITE)
+        return select(exists().where(condition))
+
     async def check_access(self, access: Enum, user_id: str, file_id: str) -> bool:
-        """Проверяет доступ к файлу."""
+        """Проверяет доступ к файлу: для READ достаточно любой записи доступа, для WRITE нужна запись с WRITE."""
+        allowed = access_cache.get(user_id, file_id, access.name)
+        if allowed is not None:
+            return allowed
         try:
             async with self.session:
-                select_request = select(FilesAccessOrm).where(
-                    FilesAccessOrm.file_id == file_id)
-                access_records = await self.session.execute(select_request)
-                file_access_list = list(access_records.scalars().all())
-                if access.name == FileAccessModeOrm.WRITE.name:
-                    return any(item.user_id == user_id and item.file_access_mode.name == access.name for item in file_access_list)
-                else:
-                    return any(item.user_id == user_id for item in file_access_list)
+                allowed = bool(await self.session.scalar(self.access_check_query(access, user_id, file_id)))
+                access_cache.set(user_id, file_id, access.name, allowed)
+                return allowed
         except Exception as e:
             logging.error(e.__str__())
             return None
@@ -81,6 +128,7 @@ class FilesRepository(BaseRepository):
                 )
                 self.session.add(access_record)
                 await self.session.commit()
+                access_cache.invalidate(user_id, file_id)
                 return True
         except Exception as e:
             logging.error(e.__str__())
@@ -114,6 +162,7 @@ class FilesRepository(BaseRepository):
                 file_to_del = await self.session.get(FileOrm, file_id)
                 await self.session.delete(file_to_del)
                 await self.session.commit()
+                access_cache.invalidate_file(file_id)
                 return True
         except Exception as e:
             logging.error(e.__str__())
@@ -129,6 +178,7 @@ class FilesRepository(BaseRepository):
                 )
                 result = await self.session.execute(stmt)
                 await self.session.commit()
+                access_cache.invalidate(user_id, file_id)
                 return result.rowcount > 0
         except Exception as e:
             logging.error(e.__str__())
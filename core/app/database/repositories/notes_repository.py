@@ -1,8 +1,10 @@
-from sqlalchemy import select, delete, update
+from sqlalchemy import delete, update
+from sqlalchemy.sql import StatementLambdaElement
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from app.database.models import NoteOrm
 from .base_repository import BaseRepository
+from app.utils.pagination import keyset_page, split_page
 import logging
 import uuid
 from typing import TYPE_CHECKING
@@ -20,13 +22,20 @@ class NotesRepository(BaseRepository):
     def repository_factory():
         return NotesRepository()
 
-    async def get_all_notes_by_user_id(self, user_id: str) -> list[NoteOrm] | None:
-        """Возвращает все заметки, связанные с пользователем."""
+    @staticmethod
+    def notes_page_query(user_id: str, limit: int | None, after: tuple[int, str] | None = None, fields: list[str] | None = None) -> StatementLambdaElement:
+        """Запрос страницы заметок пользователя от новых к старым (keyset по created_at, id)"""
+        query = BaseRepository.select_fields(NoteOrm, fields)
+        query += lambda s: s.where(NoteOrm.user_id == user_id)
+        return keyset_page(query, NoteOrm.created_at, NoteOrm.id, limit, after)
+
+    async def get_user_notes_page(self, user_id: str, limit: int | None, after: tuple[int, str] | None = None, fields: list[str] | None = None) -> tuple[list, tuple[int, str] | None] | None:
+        """Возвращает страницу заметок пользователя от новых к старым и ключ следующей страницы; fields - выбрать только эти колонки."""
         try:
             async with self.session:
-                query = select(NoteOrm).where(NoteOrm.user_id == user_id)
+                query = self.notes_page_query(user_id, limit, after, fields)
                 result = await self.session.execute(query)
-                return list(result.scalars().all())
+                return split_page(self.fetch_rows(result, fields), limit, "created_at")
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
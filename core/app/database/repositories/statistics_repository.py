@@ -1,9 +1,15 @@
+import time
 from enum import Enum
-from sqlalchemy import func, select, update
+from sqlalchemy import func, select, update, union_all, and_, or_, lambda_stmt, bindparam, cast, BigInteger
+from sqlalchemy.sql import Select, StatementLambdaElement
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from app.database.models import StatisticOrm, WorkTypesOrm, KpiOrm, KpiLevelsOrm
+from app.database.models import StatisticOrm, StatisticDailyOrm, WorkTypesOrm, KpiOrm, KpiLevelsOrm, UserOrm, UserTypesOrm
 from .base_repository import BaseRepository
+from app.database.replicas import read_only
+from app.utils.kpi_cache import KpiSummaryCache, month_key
 import logging
 from typing import TYPE_CHECKING
 
@@ -11,6 +17,39 @@ if TYPE_CHECKING:
     from app.api.models import *
 
 
+SECONDS_IN_DAY = 24 * 60 * 60
+
+
+def day_start(timestamp: int) -> int:
+    """Начало суток (UTC) для unix времени"""
+    return timestamp - timestamp % SECONDS_IN_DAY
+
+
+def kpi_upsert():
+    """INSERT ... ON CONFLICT в kpi из массивов-колонок: размер пачки не ограничен числом параметров запроса"""
+    kpi = KpiOrm.__table__
+    rows = func.unnest(
+        bindparam("user_ids", type_=ARRAY(kpi.c.user_id.type)),
+        bindparam("kpi_levels", type_=ARRAY(kpi.c.kpi_level.type)),
+        bindparam("base_salary_percentages", type_=ARRAY(kpi.c.base_salary_percentage.type)),
+        bindparam("kpis", type_=ARRAY(kpi.c.kpi.type))
+    ).table_valued("user_id", "kpi_level", "base_salary_percentage", "kpi").render_derived()
+    query = insert(kpi).from_select(
+        [kpi.c.user_id, kpi.c.kpi_level, kpi.c.base_salary_percentage, kpi.c.kpi], select(rows))
+    return query.on_conflict_do_update(
+        index_elements=[kpi.c.user_id],
+        set_={
+            "kpi_level": query.excluded.kpi_level,
+            "base_salary_percentage": query.excluded.base_salary_percentage,
+            "kpi": query.excluded.kpi
+        }
+    )
+
+
+KPI_UPSERT = kpi_upsert()
+kpi_summary_cache = KpiSummaryCache.factory()
+
+
 class StatisticsRepository(BaseRepository):
     """
     Класс репозиторий для работы с записями звонков в базе данных.
@@ -25,31 +64,208 @@ class StatisticsRepository(BaseRepository):
         try:
             async with self.session:
                 new_stat_record = StatisticOrm(**stat.model_dump())
-                stat.id = None
+                new_stat_record.id = None
                 self.session.add(new_stat_record)
+                await self.session.execute(self.daily_rollup_upsert([stat.model_dump()]))
                 await self.session.commit()
+                await kpi_summary_cache.invalidate([stat.user_id], [month_key(stat.date_time)])
                 return new_stat_record.id
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
 
+    async def add_statistics_records(self, stats: list['Statistic']) -> list[str] | None:
+        """Добавляет пачку записей статистики одним многострочным INSERT в одной транзакции."""
+        try:
+            async with self.session:
+                rows = [{**stat.model_dump(), "id": str(uuid.uuid4())}
+                        for stat in stats]
+                await self.session.execute(insert(StatisticOrm), rows)
+                await self.session.execute(self.daily_rollup_upsert(rows))
+                await self.session.commit()
+                await kpi_summary_cache.invalidate(
+                    [row["user_id"] for row in rows], [month_key(row["date_time"]) for row in rows])
+                return [row["id"] for row in rows]
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def daily_rollup_upsert(rows: list[dict]):
+        """INSERT ... ON CONFLICT, прибавляющий записи к суточным суммам statistics_daily"""
+        totals: dict[tuple, int] = {}
+        for row in rows:
+            key = (row["user_id"], day_start(row["date_time"]), row["work_type"])
+            totals[key] = totals.get(key, 0) + (row["count"] or 0)
+        query = insert(StatisticDailyOrm).values([
+            {"user_id": user_id, "day": day, "work_type": work_type, "count": count}
+            for (user_id, day, work_type), count in totals.items()
+        ])
+        return query.on_conflict_do_update(
+            index_elements=[StatisticDailyOrm.user_id,
+                            StatisticDailyOrm.day, StatisticDailyOrm.work_type],
+            set_={"count": StatisticDailyOrm.count + query.excluded.count}
+        )
+
+    @staticmethod
+    def period_totals_query(user_ids: list[str], start: int, end: int) -> StatementLambdaElement:
+        """
+        Запрос (user_id, work_type, сумма count) пользователей user_ids за период [start, end]:
+        целые сутки берутся из statistics_daily, неполные края - из statistics.
+        Строки одной пары (user_id, work_type) из двух частей UNION складываются вызывающим.
+        """
+        first_day = day_start(start + SECONDS_IN_DAY - 1)
+        last_day = day_start(end + 1) - SECONDS_IN_DAY
+        if first_day > last_day:
+            return lambda_stmt(lambda: (
+                select(StatisticOrm.user_id, StatisticOrm.work_type, func.sum(StatisticOrm.count))
+                .where(StatisticOrm.user_id.in_(user_ids))
+                .where(StatisticOrm.date_time >= start, StatisticOrm.date_time <= end)
+                .group_by(StatisticOrm.user_id, StatisticOrm.work_type)
+            ))
+        # NOTE: все значения вычисляются вне lambda, чтобы попасть в кешированный SQL параметрами
+        edge_start = last_day + SECONDS_IN_DAY
+        return lambda_stmt(lambda: union_all(
+            select(StatisticDailyOrm.user_id, StatisticDailyOrm.work_type, func.sum(StatisticDailyOrm.count))
+            .where(StatisticDailyOrm.user_id.in_(user_ids))
+            .where(StatisticDailyOrm.day >= first_day, StatisticDailyOrm.day <= last_day)
+            .group_by(StatisticDailyOrm.user_id, StatisticDailyOrm.work_type),
+            select(StatisticOrm.user_id, StatisticOrm.work_type, func.sum(StatisticOrm.count))
+            .where(StatisticOrm.user_id.in_(user_ids))
+            .where(or_(
+                and_(StatisticOrm.date_time >= start,
+                     StatisticOrm.date_time < first_day),
+                and_(StatisticOrm.date_time >= edge_start,
+                     StatisticOrm.date_time <= end)
+            ))
+            .group_by(StatisticOrm.user_id, StatisticOrm.work_type)
+        ))
+
+    @read_only
     async def get_statistics_in_period(self, user_id: str, start: int, end: int) -> dict[WorkTypesOrm | str, int]:
         """Возвращает статистику за период от start до end."""
+        stats = await self.get_users_statistics_in_period([user_id], start, end)
+        return None if stats is None else stats[user_id]
+
+    @read_only
+    async def get_users_statistics_in_period(self, user_ids: list[str], start: int, end: int) -> dict[str, dict[WorkTypesOrm | str, int]] | None:
+        """Возвращает статистику нескольких пользователей за период одним запросом: {user_id: {work_type: count}}."""
+        try:
+            async with self.session:
+                query = self.period_totals_query(list(set(user_ids)), start, end)
+                records = await self.session.execute(query)
+                stats = {user_id: {} for user_id in user_ids}
+                for user_id, work_type, total_count in records.fetchall():
+                    stats[user_id][work_type] = stats[user_id].get(work_type, 0) + (total_count or 0)
+                return stats
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def bucket_start(column, bucket: str, timezone: str):
+        """Начало интервала bucket (day, week, month) в часовом поясе timezone для unix времени column, тоже в unix времени"""
+        return cast(func.extract("epoch", func.date_trunc(bucket, func.to_timestamp(column), timezone)), BigInteger)
+
+    @staticmethod
+    def statistics_series_query(user_id: str, start: int, end: int, bucket: str, timezone: str) -> Select:
+        """
+        Запрос (начало интервала, work_type, сумма count) статистики пользователя за период [start, end] по интервалам bucket.
+        В UTC целые сутки берутся из statistics_daily, в остальных часовых поясах сутки не совпадают с ее днями.
+        """
+        first_day = day_start(start + SECONDS_IN_DAY - 1)
+        last_day = day_start(end + 1) - SECONDS_IN_DAY
+        raw = select(
+            StatisticsRepository.bucket_start(StatisticOrm.date_time, bucket, timezone).label("bucket"),
+            StatisticOrm.work_type, StatisticOrm.count
+        ).where(StatisticOrm.user_id == user_id)
+        if timezone == "UTC" and first_day <= last_day:
+            rows = union_all(
+                select(
+                    StatisticsRepository.bucket_start(StatisticDailyOrm.day, bucket, timezone).label("bucket"),
+                    StatisticDailyOrm.work_type, StatisticDailyOrm.count
+                )
+                .where(StatisticDailyOrm.user_id == user_id)
+                .where(StatisticDailyOrm.day >= first_day, StatisticDailyOrm.day <= last_day),
+                raw.where(or_(
+                    and_(StatisticOrm.date_time >= start,
+                         StatisticOrm.date_time < first_day),
+                    and_(StatisticOrm.date_time >= last_day + SECONDS_IN_DAY,
+                         StatisticOrm.date_time <= end)
+                ))
+            ).subquery()
+        else:
+            rows = raw.where(StatisticOrm.date_time >= start, StatisticOrm.date_time <= end).subquery()
+        return (
+            select(rows.c.bucket, rows.c.work_type, func.sum(rows.c.count))
+            .group_by(rows.c.bucket, rows.c.work_type)
+        )
+
+    @read_only
+    async def get_statistics_series(self, user_id: str, start: int, end: int, bucket: str, timezone: str) -> dict[tuple[int, WorkTypesOrm], int] | None:
+        """Возвращает суммы статистики пользователя за период по интервалам одним запросом: {(начало интервала, work_type): count}."""
+        try:
+            async with self.session:
+                result = await self.session.execute(self.statistics_series_query(user_id, start, end, bucket, timezone))
+                return {(bucket_start, work_type): total_count or 0
+                        for bucket_start, work_type, total_count in result.all()}
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @staticmethod
+    def last_month_kpis_query(user_ids: list[str]) -> StatementLambdaElement:
+        """Запрос KPI пользователей user_ids"""
+        ids = list(set(user_ids))
+        return lambda_stmt(lambda: select(KpiOrm).where(KpiOrm.user_id.in_(ids)))
+
+    @read_only
+    async def get_last_month_kpis(self, user_ids: list[str]) -> dict[str, 'Kpi'] | None:
+        """Возвращает установленные за прошлый месяц KPI нескольких пользователей одним запросом: {user_id: Kpi}."""
+        from app.api.models import Kpi
+        try:
+            async with self.session:
+                query = self.last_month_kpis_query(user_ids)
+                result = await self.session.execute(query)
+                return {kpi.user_id: Kpi.model_validate(kpi, from_attributes=True)
+                        for kpi in result.scalars().all()}
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    @read_only
+    async def get_kpi_inputs_in_period(self, work_types: list[WorkTypesOrm], start: int, end: int) -> dict[str, list] | None:
+        """
+        Возвращает одним запросом по всем частным риелторам текущий KPI и суммы статистики work_types
+        за период, по колонкам: {"user_id": [...], "kpi_level": [...], "base_salary_percentage": [...], work_type: [...]}.
+        У пользователей без KPI kpi_level и base_salary_percentage равны None.
+        """
         try:
             async with self.session:
+                totals = (
+                    select(
+                        StatisticOrm.user_id,
+                        *[func.sum(StatisticOrm.count).filter(StatisticOrm.work_type == work_type).label(work_type.name)
+                          for work_type in work_types]
+                    )
+                    .where(StatisticOrm.date_time >= start, StatisticOrm.date_time <= end)
+                    .group_by(StatisticOrm.user_id)
+                    .subquery()
+                )
                 query = (
                     select(
-                        StatisticOrm.work_type,
-                        func.sum(StatisticOrm.count).label('total_count')
+                        UserOrm.id, KpiOrm.kpi_level, KpiOrm.base_salary_percentage,
+                        *[func.coalesce(totals.c[work_type.name], 0) for work_type in work_types]
                     )
-                    .where(StatisticOrm.user_id == user_id)
-                    .where(StatisticOrm.date_time >= start)
-                    .where(StatisticOrm.date_time <= end)
-                    .group_by(StatisticOrm.work_type)
+                    .outerjoin(KpiOrm, KpiOrm.user_id == UserOrm.id)
+                    .outerjoin(totals, totals.c.user_id == UserOrm.id)
+                    .where(UserOrm.type == UserTypesOrm.PRIVATE)
                 )
-                records = await self.session.execute(query)
-                all_works = records.fetchall()
-                return {work_type: total_count for work_type, total_count in all_works}
+                result = await self.session.execute(query)
+                names = ["user_id", "kpi_level", "base_salary_percentage", *[work_type.name for work_type in work_types]]
+                rows = result.all()
+                columns = list(zip(*rows)) if rows else [()] * len(names)
+                return {name: list(column) for name, column in zip(names, columns)}
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
@@ -65,17 +281,34 @@ class StatisticsRepository(BaseRepository):
 
     async def set_kpi_level(self, kpi: 'Kpi') -> bool:
         """Устанавливает KPI вручную. Если не было записи - создаст"""
+        return await self.set_kpi_levels([kpi])
+
+    async def set_kpi_levels(self, kpis: list['Kpi']) -> bool:
+        """Устанавливает KPI нескольким пользователям одним INSERT ... ON CONFLICT; у кого не было записи - создаст"""
+        # NOTE: ON CONFLICT не может обновить одну строку дважды, поэтому для пользователя берется последний KPI
+        kpis = list({kpi.user_id: kpi for kpi in kpis}.values())
+        return await self.upsert_kpi_columns(
+            [kpi.user_id for kpi in kpis],
+            [KpiLevelsOrm(kpi.kpi_level) for kpi in kpis],
+            [kpi.base_salary_percentage for kpi in kpis],
+            [kpi.kpi for kpi in kpis]
+        )
+
+    async def upsert_kpi_columns(self, user_ids: list[str], kpi_levels: list[KpiLevelsOrm], base_salary_percentages: list[float], kpis: list[float]) -> bool:
+        """Записывает KPI, переданные по колонкам (user_id в них не повторяются), одним INSERT ... SELECT FROM unnest(...)"""
+        if not user_ids:
+            return True
         try:
             async with self.session:
-                current_kpi = await self.session.get(KpiOrm, kpi.user_id)
-                if not current_kpi:
-                    self.session.add(KpiOrm(**kpi.model_dump()))
-                else:
-                    current_kpi.user_id = kpi.user_id
-                    current_kpi.kpi_level = kpi.kpi_level
-                    current_kpi.base_salary_percentage = kpi.base_salary_percentage
-                    current_kpi.kpi = kpi.kpi
+                await self.session.execute(KPI_UPSERT, {
+                    "user_ids": user_ids,
+                    "kpi_levels": kpi_levels,
+                    "base_salary_percentages": base_salary_percentages,
+                    "kpis": kpis
+                })
                 await self.session.commit()
+                # NOTE: сводка KPI считается только за текущий месяц, старые записи кеша уже не читаются
+                await kpi_summary_cache.invalidate(user_ids, [month_key(time.time())])
                 return True
         except SQLAlchemyError as e:
             logging.error(e.__str__())
@@ -1,7 +1,8 @@
-from sqlalchemy import select
+from sqlalchemy.sql import StatementLambdaElement
 from sqlalchemy.exc import SQLAlchemyError
 from app.database.models import TaskOrm, WorkTypesOrm
 from .base_repository import BaseRepository
+from app.utils.pagination import keyset_page, split_page
 import logging
 from typing import TYPE_CHECKING
 
@@ -18,14 +19,20 @@ class TasksRepository(BaseRepository):
     def repository_factory():
         return TasksRepository()
 
-    async def get_all_tasks_by_user_id(self, user_id: str, completed: bool) -> list[TaskOrm] | None:
-        """Возвращает все задачи, связанные с пользователем, с учетом статуса выполнения."""
+    @staticmethod
+    def tasks_page_query(user_id: str, limit: int | None, after: tuple[int, str] | None = None, completed: bool = False, fields: list[str] | None = None) -> StatementLambdaElement:
+        """Запрос страницы задач пользователя с учетом статуса выполнения от новых к старым (keyset по created_at, id)"""
+        query = BaseRepository.select_fields(TaskOrm, fields)
+        query += lambda s: s.where(TaskOrm.user_id == user_id, TaskOrm.is_completed == completed)
+        return keyset_page(query, TaskOrm.created_at, TaskOrm.id, limit, after)
+
+    async def get_user_tasks_page(self, user_id: str, limit: int | None, after: tuple[int, str] | None = None, completed: bool = False, fields: list[str] | None = None) -> tuple[list, tuple[int, str] | None] | None:
+        """Возвращает страницу задач пользователя с учетом статуса выполнения от новых к старым и ключ следующей страницы; fields - выбрать только эти колонки."""
         try:
             async with self.session:
-                query = select(TaskOrm).where(TaskOrm.user_id ==
-                                              user_id, TaskOrm.is_completed == completed)
+                query = self.tasks_page_query(user_id, limit, after, completed, fields)
                 result = await self.session.execute(query)
-                return list(result.scalars().all())
+                return split_page(self.fetch_rows(result, fields), limit, "created_at")
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
@@ -1,7 +1,10 @@
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select, update
+from sqlalchemy import select, update, lambda_stmt
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import StatementLambdaElement
 from app.database.models import TeamOrm, UserTeamOrm, UserStatusesOrm, UserOrm, AddressOrm, CallOrm
 from .base_repository import BaseRepository
+from app.database.replicas import read_only
 import logging
 from typing import TYPE_CHECKING
 
@@ -10,6 +13,11 @@ if TYPE_CHECKING:
     from app.common.models import *
 
 
+# NOTE: алиасы общие для всех вызовов, иначе у каждого запроса был бы свой ключ в кеше скомпилированного SQL
+my_team = aliased(UserTeamOrm)
+member = aliased(UserTeamOrm)
+
+
 class TeamsRepository(BaseRepository):
     """
     Класс репозиторий для работы с командами в базе данных.
@@ -19,33 +27,39 @@ class TeamsRepository(BaseRepository):
     def repository_factory():
         return TeamsRepository()
 
+    @staticmethod
+    def teams_by_user_query(user_id: str) -> StatementLambdaElement:
+        """Запрос (команда, роль участника, участник) по всем командам пользователя"""
+        return lambda_stmt(lambda: (
+            select(TeamOrm, member.role, UserOrm)
+            .join(my_team, my_team.team_id == TeamOrm.id)
+            .join(member, member.team_id == TeamOrm.id)
+            .join(UserOrm, UserOrm.id == member.user_id)
+            .where(my_team.user_id == user_id)
+            .order_by(TeamOrm.created_at, TeamOrm.id)
+        ))
+
+    @read_only
     async def get_all_teams_by_user_id(self, user_id: str) -> list['TeamWithInfo'] | None:
         """Возвращает все команды, связанные с пользователем, с дополнительной информацией."""
         from app.common.models import TeamWithInfo, UserWithRole
         from app.api.models import Team, User, Address, Call, StatisticAggregated, Kpi
         try:
             async with self.session:
-                query = select(UserTeamOrm).where(
-                    UserTeamOrm.user_id == user_id)
+                # NOTE: один запрос: команды пользователя вместе со всеми участниками и их ролями
+                query = self.teams_by_user_query(user_id)
                 result = await self.session.execute(query)
-                user_teams = result.scalars().all()
-
-                teams_with_info = []
-                for user_team in user_teams:
-                    team = await self.session.get(TeamOrm, user_team.team_id)
-
-                    query_userteam = select(UserTeamOrm).where(
-                        UserTeamOrm.team_id == team.id)
-                    result_team_users = await self.session.execute(query_userteam)
-                    team_users = result_team_users.scalars().all()
-
-                    teams_with_info.append(TeamWithInfo(team=Team.from_orm(team), members=[
-                        UserWithRole(
-                            user=User.from_orm(await self.session.get(UserOrm, team_user.user_id)),
-                            role=team_user.role.name
-                        ) for team_user in team_users
-                    ]))
-                return teams_with_info
+
+                teams_with_info: dict[str, TeamWithInfo] = {}
+                for team, role, user in result.all():
+                    if team.id not in teams_with_info:
+                        teams_with_info[team.id] = TeamWithInfo(
+                            team=Team.model_validate(team), members=[])
+                    teams_with_info[team.id].members.append(UserWithRole(
+                        user=User.model_validate(user),
+                        role=role.name
+                    ))
+                return list(teams_with_info.values())
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
@@ -63,6 +77,35 @@ class TeamsRepository(BaseRepository):
             logging.error(e.__str__())
             return None
 
+    async def get_team_roles(self, team_id: str) -> dict[str, UserStatusesOrm] | None:
+        """Возвращает роли всех участников команды: {user_id: роль}."""
+        try:
+            async with self.session:
+                query = select(UserTeamOrm.user_id, UserTeamOrm.role).where(
+                    UserTeamOrm.team_id == team_id)
+                result = await self.session.execute(query)
+                return {user_id: role for user_id, role in result.all()}
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
+
+    async def is_owner_of_user(self, owner_id: str, user_id: str) -> bool:
+        """Является ли owner_id Owner хотя бы в одной команде, в которой состоит user_id."""
+        try:
+            async with self.session:
+                query = select(my_team.team_id).join(
+                    member, member.team_id == my_team.team_id
+                ).where(
+                    my_team.user_id == owner_id,
+                    my_team.role == UserStatusesOrm.OWNER,
+                    member.user_id == user_id
+                ).limit(1)
+                result = await self.session.execute(query)
+                return result.first() is not None
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return False
+
     async def add_team(self, data: 'Team', user_id: str) -> str | None:
         """Добавляет новую команду в базу данных."""
         from app.api.models import Team, UserTeam, UserStatuses
@@ -1,5 +1,7 @@
+from sqlalchemy import select, lambda_stmt
+from sqlalchemy.sql import StatementLambdaElement
 from sqlalchemy.exc import SQLAlchemyError
-from app.database.models import UserOrm, UserTypesOrm
+from app.database.models import UserOrm, UserTypesOrm, UserCredentialsOrm, TokenOrm
 from .base_repository import BaseRepository
 import logging
 from typing import TYPE_CHECKING
@@ -56,3 +58,24 @@ class UsersRepository(BaseRepository):
         except SQLAlchemyError as e:
             logging.error(e.__str__())
             return None
+
+    @staticmethod
+    def token_owner_query(token_id: str, user_id: str) -> StatementLambdaElement:
+        """Запрос учетных данных владельца токена token_id из auth.tokens"""
+        return lambda_stmt(lambda: (
+            select(UserCredentialsOrm)
+            .join(TokenOrm, TokenOrm.user_id == UserCredentialsOrm.id)
+            .where(TokenOrm.id == token_id, TokenOrm.user_id == user_id)
+        ))
+
+    async def get_token_owner(self, token_id: str, user_id: str) -> UserCredentialsOrm | None:
+        """Возвращает учетные данные владельца токена, если токен token_id выдан ему в auth и не отозван (есть в auth.tokens)."""
+        # NOTE: не read_only - выход из аккаунта удаляет токен, и реплика, которая отстает, еще пустила бы его
+        try:
+            async with self.session:
+                query = self.token_owner_query(token_id, user_id)
+                result = await self.session.execute(query)
+                return result.scalars().first()
+        except SQLAlchemyError as e:
+            logging.error(e.__str__())
+            return None
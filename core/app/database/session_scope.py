@@ -0,0 +1,71 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from .orm import new_session
+
+
+class ScopedSession(AsyncSession):
+    """
+    Сессия области запроса: async with в методах репозиториев ее не закрывает, чтобы вложенные блоки
+    репозиториев работали через одно соединение; при ошибке внутри блока незавершенная транзакция откатывается.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            await self.rollback()
+
+
+class SessionScope:
+    """
+    Общая для всех репозиториев сессия одного запроса; создается при первом обращении.
+    Соединение держится только внутри блоков async with репозиториев: при выходе из внешнего блока
+    оно возвращается в пул, и внешние вызовы (MinIO, RabbitMQ, HTTP) между блоками его не занимают.
+    """
+
+    def __init__(self, user_id: str | None = None):
+        self.user_id = user_id
+        self.__session: AsyncSession | None = None
+        self.__blocks = 0
+
+    @property
+    def session(self) -> AsyncSession:
+        # NOTE: AsyncSession берет соединение из пула только на первом запросе к БД
+        if self.__session is None:
+            self.__session = ScopedSession(**new_session.kw)
+            # NOTE: по user_id RoutingSession отправляет чтения недавно писавшего пользователя на основную БД
+            self.__session.sync_session.user_id = self.user_id
+        return self.__session
+
+    def enter_block(self):
+        self.__blocks += 1
+
+    async def exit_block(self):
+        """Выход из блока репозитория; после внешнего блока соединение возвращается в пул"""
+        self.__blocks -= 1
+        if self.__blocks == 0:
+            await self.close()
+
+    async def close(self):
+        """Откатывает незавершенную транзакцию и возвращает соединение в пул; сессией можно пользоваться дальше"""
+        if self.__session is not None:
+            await self.__session.close()
+
+
+current_session_scope: ContextVar[SessionScope | None] = ContextVar(
+    "current_session_scope", default=None)
+
+
+@asynccontextmanager
+async def session_scope(user_id: str | None = None) -> AsyncIterator[SessionScope]:
+    """Область, в которой все репозитории работают через одну сессию"""
+    scope = SessionScope(user_id)
+    token = current_session_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        current_session_scope.reset(token)
+        await scope.close()
@@ -0,0 +1,71 @@
+"""
+Прогрев при старте сервиса: открывает соединения пула и выполняет на каждом горячие запросы репозиториев,
+чтобы первые запросы пользователей не платили за установку соединения, компиляцию SQL и PREPARE.
+"""
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from app.database.orm import config
+from app.database.replicas import replica_set, use_primary
+from app.database.session_scope import session_scope
+from app.database.repositories import UsersRepository, TeamsRepository, StatisticsRepository, CallsRepository, \
+    AddressesRepository, NotesRepository, TasksRepository
+from app.toml_helper import DatabasePoolModes
+from app.utils.pagination import PAGE_SIZE_DEFAULT
+
+
+# NOTE: пользователя с таким id нет, запросы ничего не находят, но полностью проходят компиляцию и PREPARE
+WARMUP_USER_ID = "-"
+WARMUP_PERIOD_END = 2 ** 31 - 1
+WARMUP_AFTER = (WARMUP_PERIOD_END, WARMUP_USER_ID)
+
+
+async def warmup_connection(primary: bool):
+    """
+    Выполняет горячие запросы в одной сессии, то есть на одном соединении пула: основной БД при primary,
+    иначе реплики, на которую read_only методы отправят чтения этой сессии
+    """
+    with use_primary() if primary else nullcontext():
+        async with session_scope():
+            user_ids = [WARMUP_USER_ID]
+            await UsersRepository().get_user_by_id(WARMUP_USER_ID)
+            await TeamsRepository().get_all_teams_by_user_id(WARMUP_USER_ID)
+            statistics = StatisticsRepository()
+            # NOTE: у запроса статистики две формы: с суточными суммами (длинный период) и только по сырым записям
+            await statistics.get_users_statistics_in_period(user_ids, 0, WARMUP_PERIOD_END)
+            await statistics.get_users_statistics_in_period(user_ids, 0, 0)
+            await statistics.get_last_month_kpis(user_ids)
+            # NOTE: у страниц три формы: весь список (без limit и cursor), первая страница и следующая
+            calls = CallsRepository()
+            for limit, after in ((None, None), (PAGE_SIZE_DEFAULT, None), (PAGE_SIZE_DEFAULT, WARMUP_AFTER)):
+                await calls.get_user_calls_page(WARMUP_USER_ID, limit, after)
+            await calls.get_last_calls_by_user_ids(user_ids, PAGE_SIZE_DEFAULT)
+            await calls.get_calls_summary_by_user_ids(user_ids)
+            addresses = AddressesRepository()
+            for limit, after in ((None, None), (PAGE_SIZE_DEFAULT, None), (PAGE_SIZE_DEFAULT, WARMUP_AFTER)):
+                await addresses.get_user_addresses_page(WARMUP_USER_ID, limit, after)
+            await addresses.get_last_addresses_by_user_ids(user_ids, PAGE_SIZE_DEFAULT)
+            await addresses.get_addresses_summary_by_user_ids(user_ids)
+            notes = NotesRepository()
+            tasks = TasksRepository()
+            for limit, after in ((None, None), (PAGE_SIZE_DEFAULT, None), (PAGE_SIZE_DEFAULT, WARMUP_AFTER)):
+                await notes.get_user_notes_page(WARMUP_USER_ID, limit, after)
+                for completed in (False, True):
+                    await tasks.get_user_tasks_page(WARMUP_USER_ID, limit, after, completed)
+
+
+async def warmup():
+    """
+    Прогревает pool_size соединений основной БД и столько же на каждую реплику;
+    через PgBouncer соединений у сервиса нет, поэтому только компиляция SQL
+    """
+    connections = 1 if config.pool_mode == DatabasePoolModes.PGBOUNCER else config.pool_size
+    started = time.perf_counter()
+    # NOTE: сессии работают одновременно, поэтому каждая берет из пула свое соединение;
+    # без use_primary read_only методы читали бы с реплик, и пул основной БД оставался бы холодным
+    await asyncio.gather(*[warmup_connection(primary=True) for _ in range(connections)])
+    # NOTE: реплики выбираются по кругу, поэтому каждой достается примерно по connections сессий
+    replica_connections = connections * len(replica_set.engines)
+    await asyncio.gather(*[warmup_connection(primary=False) for _ in range(replica_connections)])
+    logging.info(f"Прогрето соединений с БД: {connections} основной и {replica_connections} реплик за {time.perf_counter() - started:.2f} с")
@@ -4,31 +4,47 @@ import logging
 from fastapi import FastAPI, HTTPException, status
 from fastapi.responses import FileResponse, RedirectResponse
 from contextlib import asynccontextmanager
-from app.database import create_tables, drop_tables, BaseRepository
-from app.api import auth_middleware, error_middleware, router_files, router_users, router_addresses, router_calls, router_notes, router_tasks, router_teams, router_statistics
+from app.database import create_tables, drop_tables, get_pool_stats, warmup, BaseRepository
+from app.api import auth_middleware, error_middleware, session_middleware, token_cache, router_files, router_users, router_addresses, router_calls, router_notes, router_tasks, router_teams, router_statistics
 from app.utils.rabbitmq import listen
-from app.toml_helper import load_var_from_toml
+from app.utils.kpi_month_end import kpi_month_end_scheduler
+from app.database.repositories.statistics_repository import kpi_summary_cache
+from app.utils.http_client import HttpClient
+from app.toml_helper import get_settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logging.basicConfig(level=logging._nameToLevel[str(
-        load_var_from_toml("app", "log_level")).upper()])
+    settings = get_settings()
+    logging.basicConfig(level=logging._nameToLevel[settings.app.log_level.upper()])
     logging.debug("Сервер запущен")
-    # if bool(load_var_from_toml("app", "create_database")):
+    await HttpClient.open()
+    # if settings.app.create_database:
     #     await drop_tables()
     #     logging.debug("Таблицы БД сброшены")
     #     await create_tables()
     #     logging.debug("Таблицы БД созданы")
+    if settings.database.warmup:
+        try:
+            await warmup()
+        except Exception as e:
+            # NOTE: без прогрева сервис работает, только первые запросы медленнее
+            logging.warning(f"Прогрев соединений с БД не удался: {e}")
     listen_task = asyncio.create_task(listen())
     logging.debug("Слушатель сообщений запущен")
+    kpi_task = asyncio.create_task(kpi_month_end_scheduler()) if settings.app.kpi_month_end_job else None
 
     yield
+    if kpi_task is not None:
+        kpi_task.cancel()
     listen_task.cancel()
     try:
         await listen_task
     except asyncio.CancelledError:
         logging.debug("Слушатель сообщений остановлен")
+    await token_cache.close()
+    await kpi_summary_cache.close()
+    await HttpClient.close()
 
     logging.debug("Сервер выключен")
 
@@ -38,6 +54,7 @@ app = FastAPI(lifespan=lifespan,
               docs_url="/swagger"
               )
 
+app.middleware("http")(session_middleware)
 app.middleware("http")(error_middleware)
 app.middleware("http")(auth_middleware)
 
@@ -62,6 +79,11 @@ async def server_config_get():
     return {"postgres": config, "datetime": datetime.now()}
 
 
+@app.get("/pool_stats", status_code=status.HTTP_200_OK)
+async def get_pool_stats():
+    return {"http": HttpClient.stats(), "database": get_pool_stats()}
+
+
 @app.get("/supported_versions", status_code=status.HTTP_200_OK)
 async def get_supported_versions():
     return await BaseRepository.get_supported_versions()
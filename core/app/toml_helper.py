@@ -1,18 +1,33 @@
 import os
 import toml
+from enum import Enum
+from functools import lru_cache
+from pydantic import BaseModel
 
 
 TOML_PATH = r'app/config/config.toml'
 
 
-def dump_env_to_toml(filepath: str):
-    config_data = {
+def collect_env() -> dict:
+    return {
         "database": {
             "postgres_host": os.getenv("POSTGRES_HOST"),
             "postgres_port": os.getenv("POSTGRES_PORT"),
             "postgres_db": os.getenv("POSTGRES_DB"),
             "postgres_user": os.getenv("POSTGRES_USER"),
-            "postgres_password": os.getenv("POSTGRES_PASSWORD")
+            "postgres_password": os.getenv("POSTGRES_PASSWORD"),
+            "pool_mode": os.getenv("DB_POOL_MODE", default="queue"),
+            "pool_size": os.getenv("DB_POOL_SIZE", default=5),
+            "max_overflow": os.getenv("DB_MAX_OVERFLOW", default=3),
+            "pool_timeout": os.getenv("DB_POOL_TIMEOUT", default=30),
+            "pool_recycle": os.getenv("DB_POOL_RECYCLE", default=-1),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", default=False),
+            "prepared_statement_cache_size": os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", default=500),
+            "warmup": os.getenv("DB_WARMUP", default=True),
+            "partitions_ahead": os.getenv("DB_PARTITIONS_AHEAD", default=3),
+            "replica_hosts": [host for host in os.getenv("POSTGRES_REPLICA_HOSTS", default="").split(",") if host],
+            "replica_retry_seconds": os.getenv("DB_REPLICA_RETRY_SECONDS", default=30),
+            "read_your_writes_seconds": os.getenv("DB_READ_YOUR_WRITES_SECONDS", default=5)
         },
         "services": {
             "auth_host": os.getenv("AUTH_HOST"),
@@ -21,23 +36,54 @@ def dump_env_to_toml(filepath: str):
             "whisper_port": os.getenv("WHISPER_PORT"),
             "minio_api_host": os.getenv("MINIO_API_HOST"),
             "minio_api_port": os.getenv("MINIO_API_PORT"),
-            "minio_api_port": os.getenv("MINIO_API_PORT"),
             "minio_access_key": os.getenv("MINIO_ROOT_USER"),
             "minio_secret_key": os.getenv("MINIO_ROOT_PASSWORD"),
             "rabbitmq_host": os.getenv("RABBITMQ_HOST"),
             "rabbitmq_port": os.getenv("RABBITMQ_PORT"),
             "rabbitmq_user": os.getenv("RABBITMQ_DEFAULT_USER"),
             "rabbitmq_password": os.getenv("RABBITMQ_DEFAULT_PASS"),
+            "redis_host": os.getenv("REDIS_HOST"),
+            "redis_port": os.getenv("REDIS_PORT"),
+            "redis_user": os.getenv("REDIS_USER"),
+            "redis_user_password": os.getenv("REDIS_USER_PASSWORD"),
         },
         "access": {
-            "secret_key": os.getenv("SECRET_KEY")
+            "secret_key": os.getenv("SECRET_KEY"),
+            "token_verification": os.getenv("TOKEN_VERIFICATION", default="remote"),
+            "token_algorithm": os.getenv("TOKEN_ALGORITHM", default="HS256"),
+            "token_public_key": os.getenv("TOKEN_PUBLIC_KEY"),
+            "token_max_lifetime": os.getenv("TOKEN_MAX_LIFETIME", default=3 * 60 * 60)
+        },
+        "cache": {
+            "token_ttl": os.getenv("TOKEN_CACHE_TTL", default=60),
+            "token_local_ttl": os.getenv("TOKEN_CACHE_LOCAL_TTL", default=5),
+            "token_negative_ttl": os.getenv("TOKEN_CACHE_NEGATIVE_TTL", default=10),
+            "token_max_size": os.getenv("TOKEN_CACHE_MAX_SIZE", default=10000),
+            "file_access_ttl": os.getenv("FILE_ACCESS_CACHE_TTL", default=5),
+            "file_access_max_size": os.getenv("FILE_ACCESS_CACHE_MAX_SIZE", default=10000),
+            "kpi_summary_ttl": os.getenv("KPI_SUMMARY_CACHE_TTL", default=300),
+            "kpi_summary_local_ttl": os.getenv("KPI_SUMMARY_CACHE_LOCAL_TTL", default=5),
+            "kpi_summary_max_size": os.getenv("KPI_SUMMARY_CACHE_MAX_SIZE", default=10000)
+        },
+        "http": {
+            "pool_limit": os.getenv("HTTP_POOL_LIMIT", default=100),
+            "pool_limit_per_host": os.getenv("HTTP_POOL_LIMIT_PER_HOST", default=30),
+            "timeout": os.getenv("HTTP_TIMEOUT", default=10),
+            "connect_timeout": os.getenv("HTTP_CONNECT_TIMEOUT", default=3),
+            "dns_cache_ttl": os.getenv("HTTP_DNS_CACHE_TTL", default=300),
+            "keepalive_timeout": os.getenv("HTTP_KEEPALIVE_TIMEOUT", default=30)
         },
         "app": {
             "log_level": os.getenv("LOG_LEVEL", default="INFO"),
-            "create_database": os.getenv("CREATE_DATABASE", default=False)
+            "create_database": os.getenv("CREATE_DATABASE", default=False),
+            "kpi_month_end_job": os.getenv("KPI_MONTH_END_JOB", default=False)
         }
     }
 
+
+def dump_env_to_toml(filepath: str):
+    config_data = collect_env()
+
     if not os.path.exists(TOML_PATH):
         os.makedirs(os.path.dirname(TOML_PATH))
 
@@ -56,5 +102,150 @@ def load_data_from_toml(filepath: str = TOML_PATH):
         return toml.load(f)
 
 
+# -------------------------- settings --------------------------
+
+class DatabasePoolModes(str, Enum):
+    QUEUE = "queue"
+    # NOTE: для работы через PgBouncer (transaction pooling): без своего пула и без кеша prepared statements
+    PGBOUNCER = "pgbouncer"
+
+
+class DatabaseSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    postgres_host: str
+    postgres_port: int
+    postgres_db: str
+    postgres_user: str
+    postgres_password: str
+    pool_mode: DatabasePoolModes = DatabasePoolModes.QUEUE
+    pool_size: int = 5
+    max_overflow: int = 3
+    pool_timeout: float = 30
+    pool_recycle: int = -1
+    pool_pre_ping: bool = False
+    # NOTE: prepared statements, которые asyncpg держит на каждом соединении (в режиме pgbouncer всегда 0)
+    prepared_statement_cache_size: int = 500
+    # NOTE: при старте открыть соединения пула и подготовить на них горячие запросы
+    warmup: bool = True
+    # NOTE: на сколько месяцев вперед миграция partitions (и create_all) создает секции statistics, addresses и calls
+    partitions_ahead: int = 3
+    # NOTE: реплики для чтения в виде host или host:port; пользователь, пароль и база те же, что у основной
+    replica_hosts: list[str] = []
+    replica_retry_seconds: int = 30
+    read_your_writes_seconds: int = 5
+
+
+class ServicesSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    auth_host: str
+    auth_port: int
+    whisper_host: str | None = None
+    whisper_port: int | None = None
+    minio_api_host: str
+    minio_api_port: int
+    minio_access_key: str
+    minio_secret_key: str
+    rabbitmq_host: str
+    rabbitmq_port: int
+    rabbitmq_user: str
+    rabbitmq_password: str
+    redis_host: str | None = None
+    redis_port: int | None = None
+    redis_user: str | None = None
+    redis_user_password: str | None = None
+
+    @property
+    def auth_url(self) -> str:
+        return f"http://{self.auth_host}:{self.auth_port}"
+
+    @property
+    def minio_endpoint(self) -> str:
+        return f"{self.minio_api_host}:{self.minio_api_port}"
+
+
+class TokenVerificationModes(str, Enum):
+    REMOTE = "remote"
+    LOCAL = "local"
+
+
+class AccessSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    secret_key: str | None = None
+    # NOTE: local - подпись и claims проверяются в core, отзыв токена и права пользователя - по БД auth (auth.tokens,
+    # auth.user_credentials); в сервис auth идем только за токенами, которые так подтвердить не удалось
+    token_verification: TokenVerificationModes = TokenVerificationModes.REMOTE
+    token_algorithm: str = "HS256"
+    # NOTE: для RS*/ES* алгоритмов; для HS* используется secret_key
+    token_public_key: str | None = None
+    token_max_lifetime: int = 3 * 60 * 60
+
+    @property
+    def token_verification_key(self) -> str | None:
+        return self.token_public_key if self.token_public_key else self.secret_key
+
+
+class CacheSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    token_ttl: int = 60
+    token_local_ttl: int = 5
+    token_negative_ttl: int = 10
+    token_max_size: int = 10000
+    file_access_ttl: int = 5
+    file_access_max_size: int = 10000
+    kpi_summary_ttl: int = 300
+    kpi_summary_local_ttl: int = 5
+    kpi_summary_max_size: int = 10000
+
+
+class HttpSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    pool_limit: int = 100
+    pool_limit_per_host: int = 30
+    timeout: float = 10
+    connect_timeout: float = 3
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30
+
+
+class AppSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    log_level: str = "INFO"
+    create_database: bool = False
+    # NOTE: пересчет KPI в начале месяца; включать только на одном экземпляре сервиса
+    kpi_month_end_job: bool = False
+
+
+class Settings(BaseModel):
+    """Настройки сервиса, прочитанные один раз при старте"""
+    class Config:
+        frozen = True
+
+    database: DatabaseSettings
+    services: ServicesSettings
+    access: AccessSettings = AccessSettings()
+    cache: CacheSettings = CacheSettings()
+    http: HttpSettings = HttpSettings()
+    app: AppSettings = AppSettings()
+
+
+@lru_cache(maxsize=1)
+def get_settings(filepath: str = TOML_PATH) -> Settings:
+    """Читает и валидирует настройки из TOML (или из окружения, если файла нет); результат кешируется на весь процесс"""
+    data = load_data_from_toml(filepath) if os.path.exists(filepath) else collect_env()
+    return Settings.model_validate(data)
+
+
 if __name__ == "__main__":
     dump_env_to_toml(TOML_PATH)
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+import time
+from app.toml_helper import get_settings
+
+
+class AccessCache:
+    """
+    Короткоживущий кеш проверок доступа к файлам в памяти процесса: (user_id, file_id, режим) -> есть ли доступ.
+    Записи пользователя и файла сбрасываются при выдаче и отзыве доступа, остальное доживает до ttl.
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__entries: OrderedDict[tuple[str, str, str], tuple[float, bool]] = OrderedDict()
+
+    def get(self, user_id: str, file_id: str, mode: str) -> bool | None:
+        """Возвращает закешированный результат проверки или None"""
+        key = (user_id, file_id, mode)
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        expires_at, allowed = entry
+        if expires_at <= time.monotonic():
+            self.__entries.pop(key, None)
+            return None
+        self.__entries.move_to_end(key)
+        return allowed
+
+    def set(self, user_id: str, file_id: str, mode: str, allowed: bool):
+        """Кеширует результат проверки доступа"""
+        if self.ttl <= 0:
+            return
+        key = (user_id, file_id, mode)
+        self.__entries[key] = (time.monotonic() + self.ttl, allowed)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    def invalidate(self, user_id: str, file_id: str):
+        """Сбрасывает проверки пользователя для файла во всех режимах"""
+        for key in [k for k in self.__entries if k[0] == user_id and k[1] == file_id]:
+            self.__entries.pop(key, None)
+
+    def invalidate_file(self, file_id: str):
+        """Сбрасывает все проверки для файла (например, при его удалении)"""
+        for key in [k for k in self.__entries if k[1] == file_id]:
+            self.__entries.pop(key, None)
+
+    @classmethod
+    def factory(cls) -> 'AccessCache':
+        """Возвращает экземпляр AccessCache с параметрами из настроек"""
+        settings = get_settings()
+        return cls(ttl=settings.cache.file_access_ttl, max_size=settings.cache.file_access_max_size)
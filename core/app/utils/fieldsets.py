@@ -0,0 +1,30 @@
+from typing import Callable
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+
+
+def fieldset(model: type[BaseModel], required: tuple[str, ...] = ("id",)) -> Callable[..., list[str] | None]:
+    """
+    Зависимость FastAPI для параметра fields=a,b,c: список запрошенных полей модели в порядке их объявления.
+    Поля из required (id и ключ сортировки для курсора) добавляются всегда; без параметра - None (все поля).
+    """
+    def get_fields(
+        fields: str | None = Query(default=None, description=f"Через запятую, какие поля вернуть: {', '.join(model.model_fields)}")
+    ) -> list[str] | None:
+        if not fields:
+            return None
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(model.model_fields)
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.update(required)
+        return [f for f in model.model_fields if f in requested]
+    return get_fields
+
+
+def project_rows(rows: list, model: type[BaseModel], fields: list[str] | None) -> list:
+    """Модели для ORM объектов или словари только с запрошенными полями для строк из select_fields"""
+    if fields is None:
+        return [model.model_validate(row) for row in rows]
+    return [row._asdict() for row in rows]
@@ -0,0 +1 @@
+from .http_client import HttpClient
@@ -0,0 +1,64 @@
+import logging
+import aiohttp
+from app.toml_helper import get_settings
+
+
+class HttpClient:
+    """
+    Общий для всего приложения HTTP клиент с пулом keep-alive соединений.
+    Открывается в lifespan и переиспользуется auth_middleware и utils.osm.
+    """
+    session: aiohttp.ClientSession = None
+
+    @classmethod
+    async def open(cls) -> aiohttp.ClientSession:
+        """Создает сессию с настроенным пулом соединений"""
+        if cls.session is None or cls.session.closed:
+            config = get_settings().http
+            connector = aiohttp.TCPConnector(
+                limit=config.pool_limit,
+                limit_per_host=config.pool_limit_per_host,
+                ttl_dns_cache=config.dns_cache_ttl,
+                keepalive_timeout=config.keepalive_timeout
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=config.timeout,
+                connect=config.connect_timeout
+            )
+            cls.session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout)
+            logging.debug("HTTP клиент открыт")
+        return cls.session
+
+    @classmethod
+    async def close(cls):
+        """Закрывает сессию и все соединения пула"""
+        if cls.session is not None and not cls.session.closed:
+            await cls.session.close()
+            logging.debug("HTTP клиент закрыт")
+        cls.session = None
+
+    @classmethod
+    async def get_session(cls) -> aiohttp.ClientSession:
+        """Возвращает общую сессию (открывает ее, если lifespan еще не отработал)"""
+        if cls.session is None or cls.session.closed:
+            return await cls.open()
+        return cls.session
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Возвращает состояние пула соединений для мониторинга"""
+        if cls.session is None or cls.session.closed:
+            return {"opened": False}
+        connector: aiohttp.TCPConnector = cls.session.connector
+        idle_by_host = {
+            f"{key.host}:{key.port}": len(conns) for key, conns in connector._conns.items()
+        }
+        return {
+            "opened": True,
+            "limit": connector.limit,
+            "limit_per_host": connector.limit_per_host,
+            "acquired": len(connector._acquired),
+            "idle": sum(idle_by_host.values()),
+            "idle_by_host": idle_by_host
+        }
@@ -0,0 +1 @@
+from .kpi_cache import KpiSummaryCache, month_key
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import time
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from app.toml_helper import get_settings
+
+
+# NOTE: сколько ключей удалять в Redis одной командой при массовом сбросе
+REDIS_DELETE_BATCH_SIZE = 1000
+# NOTE: счетчик поколений нужен, пока сводку месяца еще читают; с запасом больше месяца
+REDIS_GENERATION_TTL_SECONDS = 40 * 24 * 3600
+# NOTE: записывает сводку, только если с момента чтения поколения ее никто не сбросил
+REDIS_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def month_key(timestamp: float) -> int:
+    """Unix время начала месяца (в локальном времени), в который попадает timestamp"""
+    moment = datetime.fromtimestamp(timestamp)
+    return int(time.mktime(datetime(moment.year, moment.month, 1).timetuple()))
+
+
+class KpiSummaryCache:
+    """
+    Двухуровневый кеш сводок KPI (JSON) по (user_id, месяц): локальный TTL/LRU в памяти процесса и общий уровень в Redis.
+    Запись сбрасывается при новой статистике пользователя за этот месяц и при изменении его KPI.
+
+    Сброс увеличивает счетчик поколения записи. Сводку считают так: generation, расчет, set с этим поколением;
+    если сброс случился во время расчета, set ее не запишет, иначе сводка без новой статистики жила бы весь TTL.
+    """
+
+    def __init__(self, ttl: int, local_ttl: int, max_size: int, redis: Redis | None = None):
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.max_size = max_size
+        self.redis = redis
+        self.__local: OrderedDict[tuple[str, int], tuple[float, str]] = OrderedDict()
+        self.__generations: dict[tuple[str, int], int] = {}
+        self.__generations_month: int | None = None
+        self.__set_if_generation = redis.register_script(REDIS_SET_IF_GENERATION) if redis is not None else None
+
+    @staticmethod
+    def __redis_key(user_id: str, month: int) -> str:
+        return f"kpi_summary:{user_id}:{month}"
+
+    @staticmethod
+    def __redis_generation_key(user_id: str, month: int) -> str:
+        return f"kpi_summary_generation:{user_id}:{month}"
+
+    def __get_local(self, key: tuple[str, int]) -> str | None:
+        entry = self.__local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self.__local.pop(key, None)
+            return None
+        self.__local.move_to_end(key)
+        return value
+
+    def __put_local(self, key: tuple[str, int], value: str):
+        self.__local[key] = (time.monotonic() + self.local_ttl, value)
+        self.__local.move_to_end(key)
+        while len(self.__local) > self.max_size:
+            self.__local.popitem(last=False)
+
+    async def get(self, user_id: str, month: int) -> str | None:
+        """Возвращает закешированную сводку пользователя за месяц или None"""
+        if self.ttl <= 0:
+            return None
+        key = (user_id, month)
+        value = self.__get_local(key)
+        if value is not None or self.redis is None:
+            return value
+        try:
+            raw = await self.redis.get(self.__redis_key(user_id, month))
+        except RedisError as e:
+            logging.warning(f"Кеш KPI в Redis недоступен: {e}")
+            return None
+        if raw is None:
+            return None
+        value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        self.__put_local(key, value)
+        return value
+
+    async def generation(self, user_id: str, month: int) -> tuple[int, str | None]:
+        """Поколение записи (локальное и в Redis); читается до расчета сводки и передается в set"""
+        local = self.__generations.get((user_id, month), 0)
+        if self.redis is None or self.ttl <= 0:
+            return local, None
+        try:
+            raw = await self.redis.get(self.__redis_generation_key(user_id, month))
+        except RedisError as e:
+            logging.warning(f"Кеш KPI в Redis недоступен: {e}")
+            return local, None
+        if raw is None:
+            return local, "0"
+        return local, raw.decode("utf-8") if isinstance(raw, bytes) else str(raw)
+
+    async def set(self, user_id: str, month: int, value: str, generation: tuple[int, str | None]):
+        """Кеширует сводку пользователя за месяц, если с чтения generation запись не сбрасывали"""
+        if self.ttl <= 0:
+            return
+        key = (user_id, month)
+        local, shared = generation
+        if self.__generations.get(key, 0) != local:
+            return
+        if self.redis is not None and shared is not None:
+            try:
+                stored = await self.__set_if_generation(
+                    keys=[self.__redis_key(user_id, month), self.__redis_generation_key(user_id, month)],
+                    args=[shared, value, self.ttl])
+            except RedisError as e:
+                logging.warning(f"Кеш KPI в Redis недоступен: {e}")
+            else:
+                if not stored:
+                    return
+        # NOTE: await выше мог пропустить сброс из этого же процесса
+        if self.__generations.get(key, 0) == local:
+            self.__put_local(key, value)
+
+    def __bump_local_generations(self, keys: list[tuple[str, int]]):
+        # NOTE: сводки прошлых месяцев не кешируются, их поколения больше не нужны
+        current = month_key(time.time())
+        if self.__generations_month != current:
+            self.__generations = {key: value for key, value in self.__generations.items() if key[1] >= current}
+            self.__generations_month = current
+        for key in keys:
+            self.__generations[key] = self.__generations.get(key, 0) + 1
+
+    async def invalidate(self, user_ids: list[str], months: list[int]):
+        """Сбрасывает сводки пользователей user_ids за месяцы months"""
+        keys = [(user_id, month) for user_id in set(user_ids) for month in set(months)]
+        self.__bump_local_generations(keys)
+        for key in keys:
+            self.__local.pop(key, None)
+        if self.redis is None or not keys:
+            return
+        try:
+            for i in range(0, len(keys), REDIS_DELETE_BATCH_SIZE):
+                batch = keys[i:i + REDIS_DELETE_BATCH_SIZE]
+                # NOTE: поколение увеличивается до удаления: set, выполненный между ними, уже не совпадет
+                async with self.redis.pipeline(transaction=False) as pipeline:
+                    for key in batch:
+                        pipeline.incr(self.__redis_generation_key(*key))
+                        pipeline.expire(self.__redis_generation_key(*key), REDIS_GENERATION_TTL_SECONDS)
+                    pipeline.delete(*[self.__redis_key(*key) for key in batch])
+                    await pipeline.execute()
+        except RedisError as e:
+            logging.warning(f"Кеш KPI в Redis недоступен: {e}")
+
+    async def close(self):
+        """Закрывает соединение с Redis"""
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    @classmethod
+    def factory(cls) -> 'KpiSummaryCache':
+        """Возвращает экземпляр KpiSummaryCache с параметрами из настроек; без redis_host работает только локальный уровень"""
+        settings = get_settings()
+        redis = None
+        if settings.services.redis_host:
+            redis = Redis(
+                host=settings.services.redis_host,
+                port=settings.services.redis_port or 6379,
+                username=settings.services.redis_user,
+                password=settings.services.redis_user_password
+            )
+        return cls(
+            ttl=settings.cache.kpi_summary_ttl,
+            local_ttl=settings.cache.kpi_summary_local_ttl,
+            max_size=settings.cache.kpi_summary_max_size,
+            redis=redis
+        )
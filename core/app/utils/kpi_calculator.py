@@ -1,3 +1,4 @@
+import numpy as np
 from app.database import KpiLevelsOrm, UserTypesOrm
 
 
@@ -72,3 +73,37 @@ class KpiCalculator:
                 raise Exception("Invalid level")
         elif self.rielter_type == UserTypesOrm.COMMERCIAL:
             raise Exception("TODO")
+
+
+# -------------------------- vectorized --------------------------
+
+KPI_LEVELS = [KpiLevelsOrm.TRAINEE, KpiLevelsOrm.SPECIALIST, KpiLevelsOrm.EXPERT, KpiLevelsOrm.TOP]
+KPI_LEVEL_INDEX = {level: i for i, level in enumerate(KPI_LEVELS)}
+
+# NOTE: пороги для уровней в порядке KPI_LEVELS, как в KpiCalculator.calculate_kpi для частных риелторов
+MIN_COLD_CALLS = np.array([200.0, 90.0, 60.0, 50.0])
+MIN_MEETINGS = np.array([84.0, 40.0, 30.0, 20.0])
+MIN_FLYERS = np.array([1200.0, 1000.0, 500.0, 500.0])
+MIN_SHOWS = np.array([80.0, 0.0, 0.0, 0.0])
+# NOTE: стажер получает только бонус за договоры, без надбавок за сделки и перевыполнение
+HAS_EXTRA_PERCENT = np.array([0.0, 1.0, 1.0, 1.0])
+BASE_PERCENT_BY_LEVEL = np.array([40.0, 43.0, 45.0, 50.0])
+
+
+def calculate_kpis(base_percent: np.ndarray, level: np.ndarray, deals_rent: np.ndarray, deals_sale: np.ndarray, regular_contracts: np.ndarray, exclusive_contracts: np.ndarray, cold_calls: np.ndarray, meetings: np.ndarray, flyers: np.ndarray, shows: np.ndarray) -> np.ndarray:
+    """KpiCalculator.calculate_kpi сразу для массива частных риелторов; level - индексы в KPI_LEVELS"""
+    min_calls, min_meetings, min_flyers = MIN_COLD_CALLS[level], MIN_MEETINGS[level], MIN_FLYERS[level]
+    qualified = (cold_calls >= min_calls) & (meetings >= min_meetings) & (flyers >= min_flyers) & (shows >= MIN_SHOWS[level])
+    bonus_percent = 0.5 * exclusive_contracts + 0.25 * regular_contracts
+    extra_percent = (
+        np.maximum(0, deals_rent + deals_sale - 1) * 2.5
+        + 2.0 * (cold_calls > min_calls) + 2.0 * (meetings > min_meetings) + 1.0 * (flyers > min_flyers)
+    ) * HAS_EXTRA_PERCENT[level]
+    return np.where(qualified, base_percent + bonus_percent + extra_percent, base_percent)
+
+
+def next_kpi_levels(deals: np.ndarray, top: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Уровни (индексы в KPI_LEVELS) и базовые проценты на следующий месяц по числу сделок, как StatisticsRepository.get_kpi_level"""
+    # NOTE: top - уровень уже TOP; ровно 21 сделка без него дает EXPERT (в get_kpi_level этот случай не покрыт)
+    level = np.select([top & (deals >= 21), deals <= 3, deals <= 20], [3, 0, 1], default=2)
+    return level, BASE_PERCENT_BY_LEVEL[level]
@@ -0,0 +1,103 @@
+"""
+Пересчет KPI по итогам месяца для всех частных риелторов: статистика месяца читается одним запросом в массивы,
+правила KpiCalculator считаются векторно, результат (KPI месяца, уровень и базовый процент на следующий месяц)
+записывается одним upsert. Пересчет сдвигает уровни, поэтому за один месяц его нужно выполнять один раз.
+
+Запуск из директории core:
+    python -m app.utils.kpi_month_end [YYYY-MM]   - пересчитать за месяц (по умолчанию за прошедший)
+"""
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from app.database import async_engine, WorkTypesOrm, KpiLevelsOrm
+from app.database.repositories import StatisticsRepository
+from app.utils.kpi_calculator import KPI_LEVELS, KPI_LEVEL_INDEX, BASE_PERCENT_BY_LEVEL, calculate_kpis, next_kpi_levels
+
+
+KPI_WORK_TYPES = [WorkTypesOrm.DEAL_RENT, WorkTypesOrm.DEAL_SALE, WorkTypesOrm.REGULAR_CONTRACT, WorkTypesOrm.EXCLUSIVE_CONTRACT,
+                  WorkTypesOrm.CALLS, WorkTypesOrm.MEET, WorkTypesOrm.FLYERS, WorkTypesOrm.SHOW]
+# NOTE: через сколько секунд после начала месяца планировщик пересчитывает прошедший месяц
+SCHEDULE_DELAY_SECONDS = 5 * 60
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def next_month_start(month: datetime) -> datetime:
+    return datetime(month.year + 1, 1, 1) if month.month == 12 else datetime(month.year, month.month + 1, 1)
+
+
+def previous_month_start(month: datetime) -> datetime:
+    return datetime(month.year - 1, 12, 1) if month.month == 1 else datetime(month.year, month.month - 1, 1)
+
+
+def month_bounds(month: datetime) -> tuple[int, int]:
+    """Unix время первой и последней секунды месяца (в локальном времени, как в router_statistics)"""
+    start = int(time.mktime(month.timetuple()))
+    end = int(time.mktime(next_month_start(month).timetuple())) - 1
+    return start, end
+
+
+async def recompute_month_kpis(month: datetime) -> int | None:
+    """Пересчитывает KPI за месяц month; возвращает число обновленных пользователей или None при ошибке БД"""
+    started = time.perf_counter()
+    start, end = month_bounds(month)
+    statistics_repository = StatisticsRepository()
+    async with statistics_repository:
+        inputs = await statistics_repository.get_kpi_inputs_in_period(KPI_WORK_TYPES, start, end)
+        if inputs is None:
+            return None
+        user_ids = inputs["user_id"]
+        if not user_ids:
+            return 0
+        # NOTE: у пользователя без KPI считается, что он стажер с базовым процентом стажера
+        level = np.fromiter((KPI_LEVEL_INDEX.get(kpi_level, 0) for kpi_level in inputs["kpi_level"]),
+                            dtype=np.intp, count=len(user_ids))
+        base_percent = np.array([np.nan if percent is None else percent
+                                 for percent in inputs["base_salary_percentage"]], dtype=np.float64)
+        base_percent = np.where(np.isnan(base_percent), BASE_PERCENT_BY_LEVEL[level], base_percent)
+        counts = {work_type: np.asarray(inputs[work_type.name], dtype=np.float64) for work_type in KPI_WORK_TYPES}
+        kpi = calculate_kpis(
+            base_percent, level,
+            counts[WorkTypesOrm.DEAL_RENT], counts[WorkTypesOrm.DEAL_SALE],
+            counts[WorkTypesOrm.REGULAR_CONTRACT], counts[WorkTypesOrm.EXCLUSIVE_CONTRACT],
+            counts[WorkTypesOrm.CALLS], counts[WorkTypesOrm.MEET],
+            counts[WorkTypesOrm.FLYERS], counts[WorkTypesOrm.SHOW]
+        )
+        deals = counts[WorkTypesOrm.DEAL_RENT] + counts[WorkTypesOrm.DEAL_SALE]
+        new_level, new_base_percent = next_kpi_levels(deals, level == KPI_LEVEL_INDEX[KpiLevelsOrm.TOP])
+        levels = [KPI_LEVELS[level_index] for level_index in new_level.tolist()]
+        if not await statistics_repository.upsert_kpi_columns(user_ids, levels, new_base_percent.tolist(), kpi.tolist()):
+            return None
+    logging.info(f"KPI за {month:%Y-%m} пересчитан для {len(user_ids)} пользователей за {time.perf_counter() - started:.2f} с")
+    return len(user_ids)
+
+
+async def kpi_month_end_scheduler():
+    """Фоновая задача: в начале каждого месяца пересчитывает KPI за прошедший"""
+    while True:
+        run_at = next_month_start(month_start(datetime.now())).timestamp() + SCHEDULE_DELAY_SECONDS
+        await asyncio.sleep(max(0.0, run_at - time.time()))
+        month = previous_month_start(month_start(datetime.now()))
+        try:
+            if await recompute_month_kpis(month) is None:
+                logging.error(f"Не удалось пересчитать KPI за {month:%Y-%m}")
+        except Exception:
+            logging.error(f"Не удалось пересчитать KPI за {month:%Y-%m}", exc_info=True)
+
+
+async def main(month: str) -> int:
+    try:
+        month = datetime.strptime(month, "%Y-%m") if month else previous_month_start(month_start(datetime.now()))
+        return 0 if await recompute_month_kpis(month) is not None else 1
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "")))
@@ -3,7 +3,7 @@ from fastapi.responses import StreamingResponse
 from minio import Minio
 from datetime import timedelta
 from minio.error import S3Error
-from app.toml_helper import load_data_from_toml
+from app.toml_helper import get_settings
 from io import BytesIO
 
 
@@ -56,9 +56,9 @@ class MinioClient:
 
     @staticmethod
     def minio_client_factory():
-        config = load_data_from_toml()["services"]
+        config = get_settings().services
         return MinioClient(
-            endpoint=f"{config['minio_api_host']}:{config['minio_api_port']}",
-            access_key=config["minio_access_key"],
-            secret_key=config["minio_secret_key"]
+            endpoint=config.minio_endpoint,
+            access_key=config.minio_access_key,
+            secret_key=config.minio_secret_key
         )
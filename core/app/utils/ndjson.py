@@ -0,0 +1,24 @@
+import logging
+from typing import Any, AsyncIterator
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson_lines(items: AsyncIterator[Any], model: type[BaseModel]) -> AsyncIterator[str]:
+    """Сериализует объекты в строки NDJSON по мере их поступления"""
+    try:
+        async for item in items:
+            yield model.model_validate(item).model_dump_json() + "\n"
+    except Exception as e:
+        # NOTE: статус ответа уже отправлен - обрываем поток, клиент увидит неполную последнюю строку или разрыв
+        logging.error(f"Экспорт NDJSON прерван: {e}")
+        raise
+
+
+def ndjson_response(items: AsyncIterator[Any], model: type[BaseModel], filename: str | None = None) -> StreamingResponse:
+    """StreamingResponse, построчно отдающий объекты в формате NDJSON"""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else None
+    return StreamingResponse(ndjson_lines(items, model), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -1,4 +1,4 @@
-import aiohttp
+from app.utils.http_client import HttpClient
 
 
 async def reverse_geocoding_by_coords(lat: float, lon: float) -> dict:
@@ -10,7 +10,7 @@ async def reverse_geocoding_by_coords(lat: float, lon: float) -> dict:
         "accept-language": "ru"
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as response:
-            response.raise_for_status()
-            return await response.json()
+    session = await HttpClient.get_session()
+    async with session.get(url, params=params) as response:
+        response.raise_for_status()
+        return await response.json()
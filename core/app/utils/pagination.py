@@ -0,0 +1,90 @@
+import base64
+import json
+from dataclasses import dataclass
+from fastapi import HTTPException, Query, status
+from sqlalchemy import tuple_
+from sqlalchemy.sql import StatementLambdaElement
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать"""
+    pass
+
+
+def encode_cursor(key: tuple[int, str]) -> str:
+    """Упаковывает ключ последней строки страницы (время, id) в непрозрачную строку"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    """Распаковывает курсор, полученный от encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+    if not isinstance(sort_value, int) or not isinstance(row_id, str):
+        raise InvalidCursor(cursor)
+    return sort_value, row_id
+
+
+def keyset_page(query: StatementLambdaElement, sort_column: InstrumentedAttribute, id_column: InstrumentedAttribute, limit: int | None, after: tuple[int, str] | None = None) -> StatementLambdaElement:
+    """
+    Keyset пагинация от новых к старым: строки строго после ключа after в порядке (sort_column, id_column) DESC.
+    Выбирает limit + 1 строку, чтобы понять, есть ли следующая страница; без limit - все строки.
+    """
+    if after is not None:
+        after_sort, after_id = after
+        query += lambda s: s.where(tuple_(sort_column, id_column) < tuple_(after_sort, after_id))
+    if limit is None:
+        query += lambda s: s.order_by(sort_column.desc(), id_column.desc())
+        return query
+    # NOTE: значения считаются вне lambda, чтобы в кешированный SQL попадали параметрами, а не константами
+    fetch = limit + 1
+    query += lambda s: s.order_by(sort_column.desc(), id_column.desc()).limit(fetch)
+    return query
+
+
+def split_page(rows: list, limit: int | None, sort_attr: str) -> tuple[list, tuple[int, str] | None]:
+    """Отрезает лишнюю строку от результата keyset_page и возвращает (строки страницы, ключ следующей страницы)"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (getattr(rows[-1], sort_attr), rows[-1].id)
+
+
+@dataclass
+class PageParams:
+    # NOTE: None - клиент не передал ни limit, ни cursor и ждет прежний ответ: весь список массивом
+    limit: int | None
+    after: tuple[int, str] | None
+
+
+def get_page_params(
+    limit: int | None = Query(default=None, ge=1, le=PAGE_SIZE_MAX, description=f"Размер страницы (с cursor по умолчанию {PAGE_SIZE_DEFAULT}); без limit и cursor возвращается весь список массивом"),
+    cursor: str | None = Query(default=None, description="Курсор из next_cursor предыдущей страницы")
+) -> PageParams:
+    """Зависимость FastAPI: параметры страницы из запроса"""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if limit is None and after is not None:
+        limit = PAGE_SIZE_DEFAULT
+    return PageParams(limit=limit, after=after)
+
+
+def page_response(rows: list, next_key: tuple[int, str] | None, page: PageParams, model: type, fields: list[str] | None):
+    """Ответ эндпоинта списка: Page, если клиент запросил страницу, иначе весь список массивом, как до пагинации"""
+    from app.api.models import Page
+    from app.utils.fieldsets import project_rows
+    items = project_rows(rows, model, fields)
+    if page.limit is None:
+        return items
+    return Page(items=items, next_cursor=encode_cursor(next_key) if next_key else None)
@@ -1,5 +1,5 @@
 from aio_pika import connect_robust, Message, Queue, Channel, IncomingMessage
-from app.toml_helper import load_data_from_toml
+from app.toml_helper import get_settings
 import os
 import asyncio
 import logging
@@ -16,12 +16,12 @@ async def send_message_to_queue(
     bucket_name: str
 ) -> bool:
     try:
-        rabbitmq_data = load_data_from_toml()
+        rabbitmq_data = get_settings().services
         connection = await connect_robust(
-            host=rabbitmq_data["services"]["rabbitmq_host"],
-            port=int(rabbitmq_data["services"]["rabbitmq_port"]),
-            login=rabbitmq_data["services"]["rabbitmq_user"],
-            password=rabbitmq_data["services"]["rabbitmq_password"]
+            host=rabbitmq_data.rabbitmq_host,
+            port=rabbitmq_data.rabbitmq_port,
+            login=rabbitmq_data.rabbitmq_user,
+            password=rabbitmq_data.rabbitmq_password
         )
 
         async with connection:
@@ -71,12 +71,12 @@ async def on_message_complete(incoming_message: IncomingMessage):
 async def listen():
     global channel
 
-    rabbitmq_data = load_data_from_toml()
+    rabbitmq_data = get_settings().services
     connection = await connect_robust(
-        host=rabbitmq_data["services"]["rabbitmq_host"],
-        port=int(rabbitmq_data["services"]["rabbitmq_port"]),
-        login=rabbitmq_data["services"]["rabbitmq_user"],
-        password=rabbitmq_data["services"]["rabbitmq_password"]
+        host=rabbitmq_data.rabbitmq_host,
+        port=rabbitmq_data.rabbitmq_port,
+        login=rabbitmq_data.rabbitmq_user,
+        password=rabbitmq_data.rabbitmq_password
     )
 
     async with connection:
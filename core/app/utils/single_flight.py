@@ -0,0 +1,25 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом: первый вызов выполняет запрос,
+    остальные ждут и получают его результат (или его исключение).
+    """
+
+    def __init__(self):
+        self.__calls: dict[str, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.__calls)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.__calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.__calls[key] = task
+            task.add_done_callback(lambda _: self.__calls.pop(key, None))
+        # NOTE: shield - отмена одного ожидающего (клиент отключился) не должна отменять общий запрос
+        return await asyncio.shield(task)
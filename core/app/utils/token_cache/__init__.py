@@ -0,0 +1 @@
+from .token_cache import TokenCache, CachedVerification
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import time
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from app.api.models import UserCredentials
+from app.toml_helper import get_settings
+
+
+@dataclass
+class CachedVerification:
+    """Результат проверки токена: либо пользователь, либо причина отказа"""
+    user: UserCredentials | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_json(cls, json_str: str):
+        data = json.loads(json_str)
+        user = data.get("user")
+        return cls(user=UserCredentials.model_validate(user) if user else None, error=data.get("error"))
+
+    def to_json(self) -> str:
+        return json.dumps({"user": self.user.model_dump(mode="json") if self.user else None, "error": self.error})
+
+
+class TokenCache:
+    """
+    Двухуровневый кеш проверок токенов: локальный TTL/LRU в памяти процесса и общий уровень в Redis.
+    Ключ - sha256 от заголовка token-authorization, сам токен нигде не хранится.
+    """
+
+    def __init__(self, ttl: int, local_ttl: int, negative_ttl: int, max_size: int, revoke_ttl: int, redis: Redis | None = None):
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.revoke_ttl = revoke_ttl
+        self.redis = redis
+        self.__local: OrderedDict[str, tuple[float, CachedVerification]] = OrderedDict()
+        self.__revoked_users: dict[str, float] = {}
+
+    @staticmethod
+    def hash_token(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __redis_key(key: str) -> str:
+        return f"token:{key}"
+
+    @staticmethod
+    def __redis_user_key(user_id: str) -> str:
+        return f"token_user:{user_id}"
+
+    @staticmethod
+    def __redis_revoked_user_key(user_id: str) -> str:
+        return f"token_user_revoked:{user_id}"
+
+    def __put_local(self, key: str, value: CachedVerification, ttl: int):
+        self.__local[key] = (time.monotonic() + ttl, value)
+        self.__local.move_to_end(key)
+        while len(self.__local) > self.max_size:
+            self.__local.popitem(last=False)
+
+    def __get_local(self, key: str) -> CachedVerification | None:
+        entry = self.__local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self.__local.pop(key, None)
+            return None
+        self.__local.move_to_end(key)
+        return value
+
+    async def get(self, token: str) -> CachedVerification | None:
+        """Возвращает закешированный результат проверки токена или None"""
+        key = self.hash_token(token)
+        value = self.__get_local(key)
+        if value is not None or self.redis is None:
+            return value
+        try:
+            raw = await self.redis.get(self.__redis_key(key))
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+            return None
+        if raw is None:
+            return None
+        value = CachedVerification.from_json(raw)
+        self.__put_local(key, value, self.local_ttl if value.user else min(
+            self.local_ttl, self.negative_ttl))
+        return value
+
+    async def set_valid(self, token: str, user: UserCredentials, ttl: int | None = None):
+        """Кеширует успешную проверку токена; ttl ограничивает время жизни записи (например, сроком действия токена)"""
+        ttl = self.ttl if ttl is None else max(1, min(ttl, self.ttl))
+        key = self.hash_token(token)
+        value = CachedVerification(user=user)
+        self.__put_local(key, value, min(self.local_ttl, ttl))
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self.__redis_key(key), value.to_json(), ex=ttl)
+                pipe.sadd(self.__redis_user_key(user.id), key)
+                pipe.expire(self.__redis_user_key(user.id), self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+
+    async def set_invalid(self, token: str, error: str, ttl: int | None = None):
+        """Кеширует отказ (негативное кеширование); по умолчанию на короткое время"""
+        ttl = self.negative_ttl if ttl is None else ttl
+        key = self.hash_token(token)
+        value = CachedVerification(error=error)
+        self.__put_local(key, value, min(self.local_ttl, ttl))
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self.__redis_key(key), value.to_json(), ex=ttl)
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+
+    async def revoke(self, token: str):
+        """Отзывает токен (выход из аккаунта) до истечения максимального срока жизни токена"""
+        await self.set_invalid(token, "token revoked", ttl=self.revoke_ttl)
+
+    async def revoke_user(self, user_id: str):
+        """Помечает пользователя: его токены нельзя проверять локально, только через сервис auth"""
+        await self.invalidate_user(user_id)
+        self.__revoked_users[user_id] = time.monotonic() + self.revoke_ttl
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self.__redis_revoked_user_key(user_id), 1, ex=self.revoke_ttl)
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+
+    async def is_user_revoked(self, user_id: str) -> bool:
+        """Был ли пользователь помечен через revoke_user"""
+        expires_at = self.__revoked_users.get(user_id)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                return True
+            self.__revoked_users.pop(user_id, None)
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(self.__redis_revoked_user_key(user_id)))
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+            # NOTE: без Redis не можем убедиться, что пользователь не отозван - пусть решает auth
+            return True
+
+    async def invalidate_user(self, user_id: str):
+        """Сбрасывает кеш всех токенов пользователя (например, при деактивации аккаунта)"""
+        for key in [k for k, (_, v) in self.__local.items() if v.user and v.user.id == user_id]:
+            self.__local.pop(key, None)
+        if self.redis is None:
+            return
+        try:
+            keys = await self.redis.smembers(self.__redis_user_key(user_id))
+            await self.redis.delete(self.__redis_user_key(user_id), *[self.__redis_key(k.decode("utf-8") if isinstance(k, bytes) else k) for k in keys])
+        except RedisError as e:
+            logging.warning(f"Кеш токенов в Redis недоступен: {e}")
+
+    async def close(self):
+        """Закрывает соединение с Redis"""
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    @classmethod
+    def factory(cls) -> 'TokenCache':
+        """Возвращает экземпляр TokenCache с параметрами из настроек; без redis_host работает только локальный уровень"""
+        settings = get_settings()
+        redis = None
+        if settings.services.redis_host:
+            redis = Redis(
+                host=settings.services.redis_host,
+                port=settings.services.redis_port or 6379,
+                username=settings.services.redis_user,
+                password=settings.services.redis_user_password
+            )
+        return cls(
+            ttl=settings.cache.token_ttl,
+            local_ttl=settings.cache.token_local_ttl,
+            negative_ttl=settings.cache.token_negative_ttl,
+            max_size=settings.cache.token_max_size,
+            revoke_ttl=settings.access.token_max_lifetime,
+            redis=redis
+        )
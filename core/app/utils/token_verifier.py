@@ -0,0 +1,48 @@
+import jwt
+from app.toml_helper import get_settings
+
+
+REGULAR_TOKEN_SUBJECT = "regular"
+
+
+class TokenUnknown(Exception):
+    """Токен не удалось разобрать локально - его нужно проверить в сервисе auth"""
+    pass
+
+
+class TokenInvalid(Exception):
+    """Токен точно недействителен (подпись, срок действия, тип)"""
+    pass
+
+
+class LocalTokenVerifier:
+    """
+    Проверяет regular токены сервиса auth (auth/internal/server/tokens) без сетевого запроса:
+    подпись общим ключом (или публичным ключом) и claims. В токене есть только user_id и id токена (jti),
+    поэтому отзыв токена, is_active и права пользователя проверяются по БД auth (auth_middleware.verify_token_locally).
+    """
+
+    def __init__(self, key: str, algorithm: str):
+        self.key = key
+        self.algorithm = algorithm
+
+    def decode(self, token: str) -> dict:
+        """Возвращает claims токена"""
+        try:
+            claims = jwt.decode(token, self.key, algorithms=[self.algorithm], options={
+                                "require": ["exp", "sub", "user_id", "jti"]})
+        except (jwt.ExpiredSignatureError, jwt.InvalidSignatureError, jwt.ImmatureSignatureError) as e:
+            raise TokenInvalid(e.__str__())
+        except jwt.InvalidTokenError as e:
+            raise TokenUnknown(e.__str__())
+        if claims["sub"] != REGULAR_TOKEN_SUBJECT:
+            raise TokenInvalid("Invalid token type")
+        return claims
+
+    @classmethod
+    def factory(cls) -> 'LocalTokenVerifier | None':
+        """Возвращает верификатор, если в настройках включен режим local и задан ключ"""
+        config = get_settings().access
+        if config.token_verification != config.token_verification.LOCAL or not config.token_verification_key:
+            return None
+        return cls(config.token_verification_key, config.token_algorithm)
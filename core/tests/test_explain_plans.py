@@ -0,0 +1,31 @@
+"""
+Регрессия планов горячих запросов: EXPLAIN запросов, которые строят репозитории, не должен содержать Seq Scan.
+Проверяется применимость индексов (enable_seqscan = off), поэтому объем данных в базе не важен.
+
+Нужна база данных с индексами (переменные окружения POSTGRES_*), запуск из директории core:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import pytest
+
+if not os.getenv("POSTGRES_HOST"):
+    pytest.skip("нужна база данных: задайте POSTGRES_HOST и остальные POSTGRES_*", allow_module_level=True)
+
+from app.database import async_engine
+from app.database.migrations import explain_hot_queries, hot_queries
+
+
+async def explain_plans() -> dict[str, list[str]]:
+    try:
+        return await explain_hot_queries()
+    finally:
+        # NOTE: соединения пула привязаны к циклу событий, а у каждого теста свой asyncio.run
+        await async_engine.dispose()
+
+
+def test_hot_queries_have_no_seq_scan():
+    regressions = asyncio.run(explain_plans())
+
+    assert hot_queries()
+    assert regressions == {}, "; ".join(f"{name}: Seq Scan по {', '.join(tables)}" for name, tables in regressions.items())
@@ -0,0 +1,68 @@
+"""
+Гонка расчета и сброса сводки KPI: запрос A прочитал статистику и считает сводку, запрос B записал новую статистику
+и сбросил запись кеша, после чего A кладет в кеш уже устаревшую сводку. Такая сводка не должна попасть в кеш.
+
+Локальный уровень проверяется всегда, общий - при заданном REDIS_HOST (и REDIS_PORT), запуск из директории core:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import time
+import uuid
+import pytest
+from app.utils.kpi_cache import KpiSummaryCache, month_key
+
+
+async def compute_with_invalidation_between(reader: KpiSummaryCache, writer: KpiSummaryCache) -> tuple[str | None, str | None]:
+    """A: generation и расчет; B: новая статистика и invalidate; A: set устаревшей сводки. Возвращает, что видят A и B"""
+    user_id, month = f"test-{uuid.uuid4().hex[:8]}", month_key(time.time())
+    generation = await reader.generation(user_id, month)
+    await writer.invalidate([user_id], [month])
+    await reader.set(user_id, month, "stale", generation)
+    return await reader.get(user_id, month), await writer.get(user_id, month)
+
+
+async def compute_without_invalidation(cache: KpiSummaryCache) -> str | None:
+    user_id, month = f"test-{uuid.uuid4().hex[:8]}", month_key(time.time())
+    await cache.invalidate([user_id], [month])
+    await cache.set(user_id, month, "fresh", await cache.generation(user_id, month))
+    return await cache.get(user_id, month)
+
+
+def local_cache() -> KpiSummaryCache:
+    return KpiSummaryCache(ttl=300, local_ttl=60, max_size=100)
+
+
+def test_local_stale_summary_is_not_cached():
+    cache = local_cache()
+
+    seen_by_reader, _ = asyncio.run(compute_with_invalidation_between(cache, cache))
+
+    assert seen_by_reader is None
+
+
+def test_local_summary_is_cached_without_invalidation():
+    assert asyncio.run(compute_without_invalidation(local_cache())) == "fresh"
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_HOST"), reason="нужен Redis: задайте REDIS_HOST")
+def test_redis_stale_summary_is_not_cached_by_another_instance():
+    from redis.asyncio import Redis
+
+    async def run():
+        # NOTE: два экземпляра сервиса: у каждого свой локальный уровень, Redis общий
+        redis = Redis(host=os.getenv("REDIS_HOST"), port=int(os.getenv("REDIS_PORT", 6379)))
+        try:
+            reader = KpiSummaryCache(ttl=300, local_ttl=60, max_size=100, redis=redis)
+            writer = KpiSummaryCache(ttl=300, local_ttl=60, max_size=100, redis=redis)
+            stale = await compute_with_invalidation_between(reader, writer)
+            fresh = await compute_without_invalidation(reader)
+            return stale, fresh
+        finally:
+            await redis.aclose()
+
+    (seen_by_reader, seen_by_writer), fresh = asyncio.run(run())
+
+    assert seen_by_reader is None
+    assert seen_by_writer is None
+    assert fresh == "fresh"
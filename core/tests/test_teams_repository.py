@@ -0,0 +1,82 @@
+"""
+Регрессия числа запросов TeamsRepository.get_all_teams_by_user_id: команды пользователя со всеми участниками
+загружаются одним запросом, сколько бы ни было команд и участников.
+
+Нужна база данных (переменные окружения POSTGRES_*), запуск из директории core:
+    python -m pytest tests
+"""
+import asyncio
+import datetime
+import os
+import uuid
+import pytest
+
+if not os.getenv("POSTGRES_HOST"):
+    pytest.skip("нужна база данных: задайте POSTGRES_HOST и остальные POSTGRES_*", allow_module_level=True)
+
+from sqlalchemy import event, delete, insert
+from app.database import async_engine, new_session
+from app.database.models import UserCredentialsOrm, UserOrm, TeamOrm, UserTeamOrm, AuthPrivilegesOrm, UserTypesOrm, UserStatusesOrm
+from app.database.repositories import TeamsRepository
+
+
+async def seed(prefix: str, teams_count: int, members_count: int) -> tuple[str, list[str]]:
+    """Пользователь prefix-0 в teams_count командах, в каждой еще members_count участников"""
+    user_ids = [f"{prefix}-{i}" for i in range(members_count + 1)]
+    team_ids = [f"{prefix}-team-{i}" for i in range(teams_count)]
+    async with new_session() as session:
+        await session.execute(insert(UserCredentialsOrm), [
+            {"id": user_id, "login": user_id, "password": "-", "privileges": AuthPrivilegesOrm.USER,
+             "created_at": datetime.datetime.now(), "is_active": True}
+            for user_id in user_ids
+        ])
+        await session.execute(insert(UserOrm), [
+            {"id": user_id, "type": UserTypesOrm.PRIVATE, "email": ""} for user_id in user_ids
+        ])
+        if team_ids:
+            await session.execute(insert(TeamOrm), [
+                {"id": team_id, "name": team_id, "created_at": i} for i, team_id in enumerate(team_ids)
+            ])
+            await session.execute(insert(UserTeamOrm), [
+                {"team_id": team_id, "user_id": user_id,
+                 "role": UserStatusesOrm.OWNER if user_id == user_ids[0] else UserStatusesOrm.USER}
+                for team_id in team_ids for user_id in user_ids
+            ])
+        await session.commit()
+    return user_ids[0], team_ids
+
+
+async def cleanup(prefix: str, team_ids: list[str]):
+    async with new_session() as session:
+        await session.execute(delete(TeamOrm).where(TeamOrm.id.in_(team_ids)))
+        await session.execute(delete(UserCredentialsOrm).where(UserCredentialsOrm.id.like(f"{prefix}-%")))
+        await session.commit()
+
+
+async def load_teams_counting_queries(teams_count: int, members_count: int) -> tuple[list, int]:
+    prefix = f"test-{uuid.uuid4().hex[:8]}"
+    user_id, team_ids = await seed(prefix, teams_count, members_count)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        async with TeamsRepository() as teams_repository:
+            teams = await teams_repository.get_all_teams_by_user_id(user_id)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+        await cleanup(prefix, team_ids)
+        # NOTE: соединения пула привязаны к циклу событий, а у каждого теста свой asyncio.run
+        await async_engine.dispose()
+    return teams, len(statements)
+
+
+@pytest.mark.parametrize("teams_count, members_count", [(0, 0), (1, 0), (1, 5), (5, 20)])
+def test_get_all_teams_by_user_id_is_one_query(teams_count: int, members_count: int):
+    teams, queries = asyncio.run(load_teams_counting_queries(teams_count, members_count))
+
+    assert queries == 1
+    assert len(teams) == teams_count
+    assert all(len(team.members) == members_count + 1 for team in teams)
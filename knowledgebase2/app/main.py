@@ -6,6 +6,7 @@ from app.settings import Settings
 from app.routers import auth_router, main_router
 from app.redis_client.redis_client import RedisClient
 from app.sessions import SessionManager
+from app.toml_helper import get_settings
 
 
 app = FastAPI(title='Knowledgebase')
@@ -17,6 +18,7 @@ app = FastAPI(title='Knowledgebase')
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # global session_manager
+    get_settings()  # NOTE: настройки валидируются один раз при старте
     Settings.session_manager = SessionManager(RedisClient.factory())
     yield
     # await session_manager.cleanup_expired_sessions()
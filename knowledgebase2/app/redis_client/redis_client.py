@@ -1,6 +1,6 @@
 import logging
 from redis.asyncio import Redis
-from app.toml_helper import load_data_from_toml
+from app.toml_helper import get_settings
 
 
 class RedisClient:
@@ -48,8 +48,7 @@ class RedisClient:
     @classmethod
     def factory(cls):
         """Возвращает экземпляр RedisClient с настроенными параметрами из TOML-конфигурации"""
-        config = load_data_from_toml()["services"]
-        instance = cls(config["redis_host"], int(
-            config["redis_port"]))
+        config = get_settings().services
+        instance = cls(config.redis_host, config.redis_port)
         instance.connect()
         return instance
@@ -1,6 +1,6 @@
 from .base_api_service import BaseApiService
 import logging
-from app.toml_helper import load_var_from_toml
+from app.toml_helper import get_settings
 from app.models import *
 
 
@@ -12,8 +12,7 @@ class AuthApiService(BaseApiService):
         return AuthApiService()
 
     def __init__(self):
-        super().__init__(load_var_from_toml("services", "auth_host") +
-                         ":" + load_var_from_toml("services", "auth_port"))
+        super().__init__(get_settings().services.auth_address)
 
     async def sign_in(self, login: str, password: str) -> str | None:
         """Делает POST запрос на api/Authentication/SignIn"""
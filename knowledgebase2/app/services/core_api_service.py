@@ -2,7 +2,7 @@ import aiohttp
 from fastapi import UploadFile
 from .base_api_service import BaseApiService
 import logging
-from app.toml_helper import load_var_from_toml
+from app.toml_helper import get_settings
 from app.models import *
 
 
@@ -14,8 +14,7 @@ class CoreApiService(BaseApiService):
         return CoreApiService()
 
     def __init__(self):
-        super().__init__(load_var_from_toml("services", "core_host") +
-                         ":" + load_var_from_toml("services", "core_port"))
+        super().__init__(get_settings().services.core_address)
 
     async def get_my_teams(self, token: str, show_stats: bool = False, show_addresses: bool = False, show_calls: bool = False) -> TeamsResponse | None:
         """Делает GET запрос на /teams/"""
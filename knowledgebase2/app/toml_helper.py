@@ -1,11 +1,13 @@
 import os
 import toml
+from functools import lru_cache
+from pydantic import BaseModel
 
 TOML_PATH = r'app/config/config.toml'
 
 
-def dump_env_to_toml(filepath: str):
-    config_data = {
+def collect_env() -> dict:
+    return {
         "services": {
             "auth_host": os.getenv("AUTH_HOST"),
             "auth_port": os.getenv("AUTH_PORT"),
@@ -24,6 +26,10 @@ def dump_env_to_toml(filepath: str):
         }
     }
 
+
+def dump_env_to_toml(filepath: str):
+    config_data = collect_env()
+
     if not os.path.exists(TOML_PATH):
         os.makedirs(os.path.dirname(TOML_PATH))
 
@@ -42,5 +48,60 @@ def load_data_from_toml(filepath: str = TOML_PATH):
         return toml.load(f)
 
 
+# -------------------------- settings --------------------------
+
+class ServicesSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    auth_host: str
+    auth_port: int
+    core_host: str
+    core_port: int
+    redis_host: str
+    redis_port: int
+    redis_user: str | None = None
+    redis_user_password: str | None = None
+
+    @property
+    def auth_address(self) -> str:
+        return f"{self.auth_host}:{self.auth_port}"
+
+    @property
+    def core_address(self) -> str:
+        return f"{self.core_host}:{self.core_port}"
+
+
+class AccessSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    secret_key: str | None = None
+
+
+class AppSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    log_level: str = "INFO"
+
+
+class Settings(BaseModel):
+    """Настройки сервиса, прочитанные один раз при старте"""
+    class Config:
+        frozen = True
+
+    services: ServicesSettings
+    access: AccessSettings = AccessSettings()
+    app: AppSettings = AppSettings()
+
+
+@lru_cache(maxsize=1)
+def get_settings(filepath: str = TOML_PATH) -> Settings:
+    """Читает и валидирует настройки из TOML (или из окружения, если файла нет); результат кешируется на весь процесс"""
+    data = load_data_from_toml(filepath) if os.path.exists(filepath) else collect_env()
+    return Settings.model_validate(data)
+
+
 if __name__ == "__main__":
     dump_env_to_toml(TOML_PATH)
@@ -4,22 +4,23 @@ from contextlib import asynccontextmanager
 import logging
 from app.rabbitmq import listen
 from app.minio_client import MinioClient
-from app.toml_helper import load_var_from_toml
+from app.toml_helper import get_settings
 
 
 @asynccontextmanager
 async def lifespan():
+    settings = get_settings()
     logging.debug("Старт")
 
     minio_client = MinioClient(
-        f"{load_var_from_toml('minio', 'minio_api_host')}:{load_var_from_toml('minio', 'minio_api_port')}",
-        load_var_from_toml("minio", "minio_access_key"),
-        load_var_from_toml("minio", "minio_secret_key")
+        settings.minio.minio_endpoint,
+        settings.minio.minio_access_key,
+        settings.minio.minio_secret_key
     )
     logging.debug("Minio клиент готов")
 
     async_whisper_model = AsyncWhisper()
-    await async_whisper_model.initialize_async(load_var_from_toml("app", "model"))
+    await async_whisper_model.initialize_async(settings.app.model)
     logging.debug("Модель готова")
 
     await listen(minio_client=minio_client, async_whisper_model=async_whisper_model)
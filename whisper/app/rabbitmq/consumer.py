@@ -1,5 +1,5 @@
 from aio_pika import connect_robust, Message, Queue, Channel, IncomingMessage
-from app.toml_helper import load_data_from_toml
+from app.toml_helper import get_settings
 from app.minio_client import MinioClient, TMP_PATH
 from app.transcription import AsyncWhisper
 import os
@@ -80,13 +80,13 @@ async def listen(minio_client: MinioClient, async_whisper_model: AsyncWhisper):
     __minio_client = minio_client
     __async_whisper_model = async_whisper_model
 
-    rabbitmq_data = load_data_from_toml()
+    rabbitmq_data = get_settings().services
 
     connection = await connect_robust(
-        host=rabbitmq_data["services"]["rabbitmq_host"],
-        port=int(rabbitmq_data["services"]["rabbitmq_port"]),
-        login=rabbitmq_data["services"]["rabbitmq_user"],
-        password=rabbitmq_data["services"]["rabbitmq_password"]
+        host=rabbitmq_data.rabbitmq_host,
+        port=rabbitmq_data.rabbitmq_port,
+        login=rabbitmq_data.rabbitmq_user,
+        password=rabbitmq_data.rabbitmq_password
     )
 
     async with connection:
@@ -1,12 +1,14 @@
 import os
 import toml
+from functools import lru_cache
+from pydantic import BaseModel
 
 
 TOML_PATH = r'app/config/config.toml'
 
 
-def dump_env_to_toml(filepath: str):
-    config_data = {
+def collect_env() -> dict:
+    return {
         "services": {
             "rabbitmq_host": os.getenv("RABBITMQ_HOST"),
             "rabbitmq_port": os.getenv("RABBITMQ_PORT"),
@@ -28,6 +30,10 @@ def dump_env_to_toml(filepath: str):
         }
     }
 
+
+def dump_env_to_toml(filepath: str):
+    config_data = collect_env()
+
     if not os.path.exists(TOML_PATH):
         os.makedirs(os.path.dirname(TOML_PATH))
 
@@ -46,5 +52,64 @@ def load_data_from_toml(filepath: str = TOML_PATH):
         return toml.load(f)
 
 
+# -------------------------- settings --------------------------
+
+class ServicesSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    rabbitmq_host: str
+    rabbitmq_port: int
+    rabbitmq_user: str
+    rabbitmq_password: str
+
+
+class MinioSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    minio_api_host: str
+    minio_api_port: int
+    minio_access_key: str
+    minio_secret_key: str
+
+    @property
+    def minio_endpoint(self) -> str:
+        return f"{self.minio_api_host}:{self.minio_api_port}"
+
+
+class AccessSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    secret_key: str | None = None
+
+
+class AppSettings(BaseModel):
+    class Config:
+        frozen = True
+
+    model: str = "base"
+    log_level: str = "INFO"
+
+
+class Settings(BaseModel):
+    """Настройки сервиса, прочитанные один раз при старте"""
+    class Config:
+        frozen = True
+
+    services: ServicesSettings
+    minio: MinioSettings
+    access: AccessSettings = AccessSettings()
+    app: AppSettings = AppSettings()
+
+
+@lru_cache(maxsize=1)
+def get_settings(filepath: str = TOML_PATH) -> Settings:
+    """Читает и валидирует настройки из TOML (или из окружения, если файла нет); результат кешируется на весь процесс"""
+    data = load_data_from_toml(filepath) if os.path.exists(filepath) else collect_env()
+    return Settings.model_validate(data)
+
+
 if __name__ == "__main__":
     dump_env_to_toml(TOML_PATH)